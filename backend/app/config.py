@@ -4,7 +4,7 @@ Configuration settings for the trading bot
 """
 import os
 from pathlib import Path
-from typing import List
+from typing import FrozenSet, List, Tuple
 
 # مسیر پروژه
 BASE_DIR = Path(__file__).parent.parent
@@ -24,6 +24,11 @@ class Settings:
     # Database
     DATABASE_URL: str = f"sqlite+aiosqlite:///{DATA_DIR}/trading_bot.db"
     
+    # Redis (کش مشترک بین workerها؛ خالی = غیرفعال)
+    REDIS_URL: str = os.getenv("REDIS_URL", "")
+    CREDENTIAL_CACHE_TTL: int = 900
+    STRATEGY_STATE_TTL: int = 3600
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-super-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
@@ -31,6 +36,7 @@ class Settings:
     
     # Encryption for API Keys
     ENCRYPTION_KEY: bytes = os.getenv("ENCRYPTION_KEY", "your-32-byte-encryption-key-here").encode()[:32].ljust(32, b'0')
+    KDF_SALT: bytes = os.getenv("KDF_SALT", "trading-bot-kdf-salt").encode()
     
     # Trading Settings
     DEFAULT_EMA_SHORT: int = 12
@@ -62,5 +68,11 @@ class Settings:
         "ETH/IRT",
         "USDT/IRT"
     ]
+    
+    # مجموعه‌ها و دسته‌بندی‌های از پیش محاسبه شده (بررسی عضویت O(1))
+    SUPPORTED_EXCHANGES_SET: FrozenSet[str] = frozenset(SUPPORTED_EXCHANGES)
+    SUPPORTED_PAIRS_SET: FrozenSet[str] = frozenset(SUPPORTED_PAIRS)
+    IRT_PAIRS: Tuple[str, ...] = tuple(pair for pair in SUPPORTED_PAIRS if "/IRT" in pair)
+    USDT_PAIRS: Tuple[str, ...] = tuple(pair for pair in SUPPORTED_PAIRS if "/USDT" in pair)
 
 settings = Settings()
\ No newline at end of file
@@ -2,18 +2,58 @@
 مدیریت دیتابیس SQLite برای ذخیره اطلاعات کاربران و معاملات
 Database management for storing user data and trading history
 """
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean
-from datetime import datetime
-from typing import AsyncGenerator
-import json
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Boolean, JSON, Index, UniqueConstraint, event, insert, select, bindparam, text
+from typing import AsyncGenerator, Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import orjson
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # Redis اختیاری است؛ بدون آن فقط کش داخلی هر worker استفاده می‌شود
+    aioredis = None
 
 from .config import settings
 
-# تنظیم دیتابیس
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+logger = logging.getLogger(__name__)
+
+# تنظیم دیتابیس - یک engine مشترک با pool اتصالات برای کل برنامه
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=20,
+    max_overflow=10,
+    pool_timeout=30,
+    pool_pre_ping=True,  # کنار گذاشتن اتصالات قطع شده پیش از استفاده
+    pool_recycle=3600
+)
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """اعمال PRAGMAهای SQLite روی هر اتصال جدید (WAL + کش صفحات در حافظه)"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# کلاینت Redis مشترک (در صورت تنظیم REDIS_URL)
+redis_client = (
+    aioredis.from_url(settings.REDIS_URL)
+    if aioredis is not None and settings.REDIS_URL
+    else None
+)
+
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -24,9 +64,12 @@ class User(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String, unique=True, index=True)  # شناسه منحصر به فرد کاربر
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
+    
+    # دریافت مقادیر پیش‌فرض سمت سرور (created_at) در همان INSERT با RETURNING
+    __mapper_args__ = {"eager_defaults": True}
 
 class ExchangeCredential(Base):
     """اطلاعات API صرافی‌ها"""
@@ -38,8 +81,14 @@ class ExchangeCredential(Base):
     encrypted_api_key = Column(Text)  # کلید API رمزنگاری شده
     encrypted_secret = Column(Text)  # Secret رمزنگاری شده
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # هر کاربر برای هر صرافی فقط یک رکورد (هدف ON CONFLICT در upsert)
+    __table_args__ = (
+        UniqueConstraint("user_id", "exchange_name", name="uq_credential_user_exchange"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
 class TradingSettings(Base):
     """تنظیمات معاملاتی کاربر"""
@@ -71,8 +120,8 @@ class TradingSettings(Base):
     is_active = Column(Boolean, default=True)
     auto_trading_enabled = Column(Boolean, default=False)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 class TradeHistory(Base):
     """تاریخچه معاملات"""
@@ -102,22 +151,30 @@ class TradeHistory(Base):
     # زمان‌بندی
     signal_time = Column(DateTime)  # زمان تولید سیگنال
     execution_time = Column(DateTime)  # زمان اجرای معامله
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
     
     # نتیجه معامله
     profit_loss = Column(Float, default=0.0)  # سود یا زیان
     fee = Column(Float, default=0.0)  # کارمزد
     
-    # متادیتا
-    metadata = Column(Text)  # اطلاعات اضافی در فرمت JSON
+    # متادیتا (نام metadata در Declarative رزرو است؛ ستون دیتابیس همان metadata می‌ماند)
+    trade_metadata = Column("metadata", JSON)  # اطلاعات اضافی در فرمت JSON
+    
+    # ایندکس‌های ترکیبی مطابق الگوی کوئری‌ها
+    __table_args__ = (
+        Index("idx_trade_user_pair_time", "user_id", "trading_pair", "created_at"),
+        Index("idx_trade_exchange_status", "exchange_name", "status"),
+        Index("idx_trade_created", "created_at"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
 class MarketData(Base):
     """داده‌های بازار برای محاسبات تکنیکال"""
     __tablename__ = "market_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    exchange_name = Column(String, index=True)
-    trading_pair = Column(String, index=True)
+    exchange_name = Column(String)
+    trading_pair = Column(String)
     
     # قیمت‌ها
     timestamp = Column(DateTime, index=True)
@@ -132,7 +189,20 @@ class MarketData(Base):
     ema_long = Column(Float)
     rsi = Column(Float)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=func.now())
+    
+    # ایندکس ترکیبی برای دریافت کندل‌های اخیر یک جفت ارز در یک صرافی
+    __table_args__ = (
+        Index("idx_market_exchange_pair_ts", "exchange_name", "trading_pair", "timestamp"),
+    )
+
+# کوئری‌های پرتکرار - یک بار در زمان import ساخته می‌شوند و فقط پارامترها bind می‌شوند
+_Q_GET_USER = select(User).where(User.user_id == bindparam("uid"))
+_Q_GET_CRED = select(ExchangeCredential).where(
+    ExchangeCredential.user_id == bindparam("uid"),
+    ExchangeCredential.exchange_name == bindparam("ex"),
+    ExchangeCredential.is_active.is_(True)
+)
 
 # وابستگی برای دریافت session دیتابیس
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -143,14 +213,121 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         finally:
             await session.close()
 
+async def get_db_manager(db: AsyncSession = Depends(get_db)) -> "DatabaseManager":
+    """وابستگی FastAPI: DatabaseManager متصل به session همان درخواست"""
+    return DatabaseManager(db)
+
+# create_all جدول موجود را تغییر نمی‌دهد؛ ایندکس یکتای لازم برای upsert کلیدهای API
+# روی دیتابیس‌های قبلی جداگانه ساخته می‌شود (ردیف‌های تکراری: جدیدترین id نگه داشته می‌شود)
+_DEDUP_CREDENTIALS_SQL = text(
+    "DELETE FROM exchange_credentials WHERE id NOT IN ("
+    "SELECT MAX(id) FROM exchange_credentials GROUP BY user_id, exchange_name)"
+)
+_CREDENTIALS_UNIQUE_INDEX_SQL = text(
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_credential_user_exchange "
+    "ON exchange_credentials(user_id, exchange_name)"
+)
+
 async def create_tables():
     """ایجاد جداول دیتابیس"""
-    from sqlalchemy.ext.asyncio import create_async_engine
-    
-    engine = create_async_engine(settings.DATABASE_URL)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
-    await engine.dispose()
+        await conn.execute(_DEDUP_CREDENTIALS_SQL)
+        await conn.execute(_CREDENTIALS_UNIQUE_INDEX_SQL)
+
+async def cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    خواندن یک مقدار JSON از Redis
+    
+    Args:
+        key: کلید کش
+        
+    Returns:
+        Optional[Dict]: مقدار ذخیره شده یا None (نبود کلید یا در دسترس نبودن Redis)
+    """
+    if redis_client is None:
+        return None
+    
+    try:
+        raw = await redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Redis GET failed for {key}: {str(e)}")
+        return None
+    
+    return orjson.loads(raw) if raw else None
+
+async def cache_set(key: str, value: Dict[str, Any], ttl: int, only_if_missing: bool = False):
+    """
+    ذخیره یک مقدار JSON در Redis با زمان انقضا
+    
+    Args:
+        key: کلید کش
+        value: مقدار قابل سریال‌سازی
+        ttl: زمان انقضا (ثانیه)
+        only_if_missing: فقط در صورت نبود کلید ذخیره شود (NX)
+    """
+    if redis_client is None:
+        return
+    
+    try:
+        await redis_client.set(key, orjson.dumps(value), ex=ttl, nx=only_if_missing)
+    except Exception as e:
+        logger.warning(f"Redis SET failed for {key}: {str(e)}")
+
+async def cache_delete(key: str):
+    """حذف یک کلید از Redis"""
+    if redis_client is None:
+        return
+    
+    try:
+        await redis_client.delete(key)
+    except Exception as e:
+        logger.warning(f"Redis DELETE failed for {key}: {str(e)}")
+
+async def cache_publish(channel: str, message: str):
+    """انتشار یک پیام روی کانال pub/sub در Redis"""
+    if redis_client is None:
+        return
+    
+    try:
+        await redis_client.publish(channel, message)
+    except Exception as e:
+        logger.warning(f"Redis PUBLISH failed for {channel}: {str(e)}")
+
+async def cache_listen(channel: str, handler: Callable[[str], None]):
+    """
+    اجرای handler برای هر پیام یک کانال pub/sub (task پس‌زمینه تا زمان لغو)
+    
+    پس از قطع اتصال، اشتراک با تأخیر کوتاه دوباره برقرار می‌شود.
+    
+    Args:
+        channel: نام کانال
+        handler: تابعی که متن هر پیام را دریافت می‌کند
+    """
+    if redis_client is None:
+        return
+    
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = message["data"]
+                handler(data.decode() if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis subscription to {channel} failed: {str(e)}")
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+async def close_redis():
+    """بستن اتصالات Redis (در shutdown برنامه)"""
+    if redis_client is not None:
+        await redis_client.aclose()
 
 # کلاس‌های کمکی برای مدیریت دیتابیس
 class DatabaseManager:
@@ -161,9 +338,7 @@ class DatabaseManager:
     
     async def get_user_by_id(self, user_id: str) -> User:
         """دریافت کاربر بر اساس شناسه"""
-        from sqlalchemy import select
-        
-        result = await self.session.execute(select(User).where(User.user_id == user_id))
+        result = await self.session.execute(_Q_GET_USER, {"uid": user_id})
         return result.scalar_one_or_none()
     
     async def create_user(self, user_id: str) -> User:
@@ -171,7 +346,6 @@ class DatabaseManager:
         user = User(user_id=user_id)
         self.session.add(user)
         await self.session.commit()
-        await self.session.refresh(user)
         return user
     
     async def save_exchange_credentials(
@@ -181,49 +355,35 @@ class DatabaseManager:
         encrypted_api_key: str, 
         encrypted_secret: str
     ) -> ExchangeCredential:
-        """ذخیره اطلاعات API صرافی"""
-        from sqlalchemy import select
-        
-        # بررسی وجود قبلی
-        result = await self.session.execute(
-            select(ExchangeCredential).where(
-                ExchangeCredential.user_id == user_id,
-                ExchangeCredential.exchange_name == exchange_name
-            )
-        )
-        existing = result.scalar_one_or_none()
-        
-        if existing:
-            # بروزرسانی
-            existing.encrypted_api_key = encrypted_api_key
-            existing.encrypted_secret = encrypted_secret
-            existing.updated_at = datetime.utcnow()
-            credential = existing
-        else:
-            # ایجاد جدید
-            credential = ExchangeCredential(
+        """ذخیره اطلاعات API صرافی (INSERT ... ON CONFLICT DO UPDATE در یک دستور)"""
+        stmt = (
+            sqlite_insert(ExchangeCredential)
+            .values(
                 user_id=user_id,
                 exchange_name=exchange_name,
                 encrypted_api_key=encrypted_api_key,
                 encrypted_secret=encrypted_secret
             )
-            self.session.add(credential)
+            .on_conflict_do_update(
+                index_elements=["user_id", "exchange_name"],
+                set_={
+                    "encrypted_api_key": encrypted_api_key,
+                    "encrypted_secret": encrypted_secret,
+                    "updated_at": func.now()
+                }
+            )
+            .returning(ExchangeCredential)
+            .execution_options(populate_existing=True)
+        )
         
+        result = await self.session.execute(stmt)
+        credential = result.scalar_one()
         await self.session.commit()
-        await self.session.refresh(credential)
         return credential
     
     async def get_exchange_credentials(self, user_id: str, exchange_name: str) -> ExchangeCredential:
         """دریافت اطلاعات API صرافی"""
-        from sqlalchemy import select
-        
-        result = await self.session.execute(
-            select(ExchangeCredential).where(
-                ExchangeCredential.user_id == user_id,
-                ExchangeCredential.exchange_name == exchange_name,
-                ExchangeCredential.is_active == True
-            )
-        )
+        result = await self.session.execute(_Q_GET_CRED, {"uid": user_id, "ex": exchange_name})
         return result.scalar_one_or_none()
     
     async def save_trade(
@@ -235,9 +395,13 @@ class DatabaseManager:
         amount: float,
         price: float,
         **kwargs
-    ) -> TradeHistory:
-        """ذخیره تاریخچه معامله"""
-        trade = TradeHistory(
+    ) -> None:
+        """
+        ثبت تاریخچه معامله در صف نویسنده پس‌زمینه
+        
+        اگر نویسنده پس‌زمینه فعال نباشد، معامله مستقیماً ذخیره می‌شود.
+        """
+        trade = dict(
             user_id=user_id,
             exchange_name=exchange_name,
             trading_pair=trading_pair,
@@ -247,7 +411,174 @@ class DatabaseManager:
             total_value=amount * price,
             **kwargs
         )
-        self.session.add(trade)
+        
+        if trade_writer.is_running:
+            trade_writer.enqueue(trade)
+        else:
+            await self.save_trades_bulk([trade])
+    
+    async def save_trades_bulk(self, trades: List[Dict[str, Any]]) -> int:
+        """
+        ذخیره دسته‌ای تاریخچه معاملات در یک تراکنش (executemany)
+        
+        Args:
+            trades: لیست دیکشنری‌ها با کلیدهای هم‌نام ستون‌های TradeHistory
+            
+        Returns:
+            int: تعداد ردیف‌های درج شده
+        """
+        if not trades:
+            return 0
+        
+        rows = []
+        for trade in trades:
+            row = dict(trade)
+            if row.get("total_value") is None:
+                row["total_value"] = row["amount"] * row["price"]
+            rows.append(row)
+        
+        await self.session.execute(insert(TradeHistory), rows)
         await self.session.commit()
-        await self.session.refresh(trade)
-        return trade
\ No newline at end of file
+        return len(rows)
+    
+    async def save_candles_bulk(self, candles: List[Dict[str, Any]]) -> int:
+        """
+        ذخیره دسته‌ای کندل‌های بازار در یک تراکنش (executemany)
+        
+        Args:
+            candles: لیست دیکشنری‌ها با کلیدهای هم‌نام ستون‌های MarketData
+            
+        Returns:
+            int: تعداد ردیف‌های درج شده
+        """
+        if not candles:
+            return 0
+        
+        await self.session.execute(insert(MarketData), candles)
+        await self.session.commit()
+        return len(candles)
+
+class AsyncTradeWriter:
+    """
+    نویسنده پس‌زمینه تاریخچه معاملات
+    
+    معاملات در یک asyncio.Queue قرار می‌گیرند و یک task واحد آن‌ها را
+    به صورت دسته‌ای (executemany) در دیتابیس ذخیره می‌کند تا مسیر اجرای
+    سفارش منتظر commit دیتابیس نماند.
+    """
+    
+    def __init__(self, batch_size: int = 200, flush_interval: float = 0.05):
+        """
+        Args:
+            batch_size: حداکثر تعداد معامله در هر درج دسته‌ای
+            flush_interval: حداکثر انتظار (ثانیه) برای تکمیل دسته
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # تعداد کل معاملاتی که حتی با درج تکی ذخیره نشدند
+        self.failed_count = 0
+    
+    @property
+    def is_running(self) -> bool:
+        """آیا task نویسنده فعال است؟"""
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """شروع task نویسنده (در startup برنامه)"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> int:
+        """
+        توقف نویسنده پس از ذخیره معاملات باقی‌مانده در صف
+        
+        Returns:
+            int: تعداد معاملاتی که هنگام توقف ذخیره نشدند
+        """
+        if self._queue is None:
+            return 0
+        
+        failed_before = self.failed_count
+        if self.is_running:
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        
+        # معاملاتی که پس از سیگنال توقف (یا پس از توقف ناگهانی task) در صف مانده‌اند
+        remaining = []
+        while not self._queue.empty():
+            trade = self._queue.get_nowait()
+            if trade is not None:
+                remaining.append(trade)
+        if remaining:
+            await self._flush(remaining)
+        
+        unwritten = self.failed_count - failed_before
+        if unwritten:
+            logger.error(f"Trade writer stopped with {unwritten} unwritten trades")
+        return unwritten
+    
+    def enqueue(self, trade: Dict[str, Any]):
+        """افزودن معامله به صف بدون انتظار"""
+        self._queue.put_nowait(trade)
+    
+    async def _run(self):
+        """حلقه اصلی: جمع‌آوری دسته و درج یک‌باره"""
+        stopping = False
+        while not stopping:
+            trade = await self._queue.get()
+            if trade is None:
+                break
+            
+            batch = [trade]
+            try:
+                while len(batch) < self.batch_size:
+                    trade = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+                    if trade is None:
+                        stopping = True
+                        break
+                    batch.append(trade)
+            except asyncio.TimeoutError:
+                pass
+            
+            await self._flush(batch)
+    
+    async def _flush(self, batch: List[Dict[str, Any]]) -> int:
+        """
+        ذخیره یک دسته معامله
+        
+        در صورت شکست درج دسته‌ای، معاملات یکی‌یکی ذخیره می‌شوند تا یک ردیف
+        نامعتبر باعث از دست رفتن بقیه دسته نشود.
+        
+        Returns:
+            int: تعداد معاملات ذخیره نشده
+        """
+        try:
+            async with AsyncSessionLocal() as session:
+                await DatabaseManager(session).save_trades_bulk(batch)
+            return 0
+        except Exception as e:
+            logger.warning(f"Bulk write of {len(batch)} trades failed, retrying one by one: {str(e)}")
+        
+        failed = 0
+        for trade in batch:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await DatabaseManager(session).save_trades_bulk([trade])
+            except Exception as e:
+                failed += 1
+                logger.error(
+                    f"Failed to write trade (user_id={trade.get('user_id')}, "
+                    f"order_id={trade.get('order_id')}): {str(e)}"
+                )
+        
+        self.failed_count += failed
+        return failed
+
+# Instance سراسری نویسنده معاملات
+trade_writer = AsyncTradeWriter()
\ No newline at end of file
@@ -3,15 +3,81 @@
 Abstract base class for all exchange implementations
 """
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any, AsyncIterator
 from datetime import datetime, timedelta
 import asyncio
+import time
+import numpy as np
 import httpx
+import ijson
+from ijson.common import ObjectBuilder
+import orjson
 from ..models.trading import MarketPrice, TradeExecutionResponse, TradeType, TradeStatus
 
+# قوانین معاملاتی پیش‌فرض (ثابت - یک بار ساخته می‌شود)
+DEFAULT_TRADING_RULES: Dict[str, Any] = {
+    "min_qty": 0.00001,
+    "max_qty": 1000000,
+    "step_size": 0.00001,
+    "min_notional": 10,
+    "price_precision": 8,
+    "qty_precision": 8
+}
+
+# Client HTTP مشترک بین همه instanceهای صرافی (حفظ اتصالات keep-alive)
+_SHARED_CLIENT: Optional[httpx.AsyncClient] = None
+
+class _AsyncByteReader:
+    """تبدیل جریان بایت‌های httpx به شیء فایل‌مانند async برای ijson"""
+    
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks
+    
+    async def read(self, size: int = -1) -> bytes:
+        if size == 0:
+            return b""
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+async def _iter_json_paths(response: httpx.Response, prefixes: Tuple[str, ...]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    پردازش جریانی بدنه پاسخ و تولید (مسیر, مقدار) برای مسیرهای prefixes
+    
+    اشیا و آرایه‌های تو در تو در مسیر منطبق به صورت کامل ساخته و یک‌جا تولید می‌شوند.
+    """
+    reader = _AsyncByteReader(response.aiter_bytes())
+    builder = None
+    depth = 0
+    item_path = ""
+    async for path, event, value in ijson.parse(reader, use_float=True):
+        if builder is not None:
+            # ساخت شیء/آرایه تو در تو تا بسته شدن کامل آن
+            builder.event(event, value)
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+                if depth == 0:
+                    yield item_path, builder.value
+                    builder = None
+        elif path in prefixes and event != "map_key":
+            if event in ("start_map", "start_array"):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+                item_path = path
+            else:
+                yield path, value
+
 class BaseExchange(ABC):
     """کلاس پایه برای همه صرافی‌ها"""
     
+    # نرخ کارمزد پیش‌فرض 0.1% (زیرکلاس‌ها فقط این ثابت‌ها را بازنویسی می‌کنند)
+    _taker_fee: float = 0.001
+    _maker_fee: float = 0.001
+    
     def __init__(self, api_key: str, secret: str, testnet: bool = False):
         """
         Initialize exchange connection
@@ -30,21 +96,51 @@ class BaseExchange(ABC):
         self.timeout = 30
         self.retry_count = 3
         self.rate_limit_per_minute = 60
-        self.last_request_time = datetime.now()
         
-        # Client HTTP
-        self.client = httpx.AsyncClient(
-            timeout=self.timeout,
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-        )
+        # سطل توکن برای محدودیت نرخ (تا rate_limit_per_minute درخواست همزمان در هر دقیقه)
+        self._tokens = float(self.rate_limit_per_minute)
+        self._refill_at = time.monotonic()
+        self._rate_lock = asyncio.Lock()
+        
+        # کش کوتاه‌مدت پاسخ‌ها (ثانیه)
+        self.ticker_cache_ttl = 1.0
+        self.balance_cache_ttl = 5.0
+        self.historical_cache_ttl = 300.0
+        self._ticker_cache: Dict[str, Tuple[float, MarketPrice]] = {}
+        self._balance_cache: Optional[Tuple[float, Dict[str, float]]] = None
+        self._historical_cache: Dict[Tuple, Tuple[float, List[Dict[str, Any]]]] = {}
     
     async def __aenter__(self):
         """Context manager entry"""
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit"""
-        await self.client.aclose()
+        """Context manager exit (client مشترک باز می‌ماند)"""
+        pass
+    
+    @classmethod
+    def _get_client(cls) -> httpx.AsyncClient:
+        """دریافت (یا ایجاد تنبل) client HTTP/2 مشترک"""
+        global _SHARED_CLIENT
+        if _SHARED_CLIENT is None or _SHARED_CLIENT.is_closed:
+            _SHARED_CLIENT = httpx.AsyncClient(
+                http2=True,
+                timeout=30,
+                limits=httpx.Limits(
+                    max_keepalive_connections=50,
+                    max_connections=100,
+                    keepalive_expiry=300
+                )
+            )
+        return _SHARED_CLIENT
+    
+    @classmethod
+    async def close_shared_client(cls):
+        """بستن client مشترک هنگام خاموش شدن برنامه"""
+        global _SHARED_CLIENT
+        if _SHARED_CLIENT is not None:
+            await _SHARED_CLIENT.aclose()
+            _SHARED_CLIENT = None
     
     @property
     @abstractmethod
@@ -159,16 +255,16 @@ class BaseExchange(ABC):
     
     # متدهای کمکی مشترک
     
-    async def _make_request(
+    async def _build_request(
         self,
         method: str,
         endpoint: str,
-        params: Optional[Dict] = None,
-        data: Optional[Dict] = None,
-        headers: Optional[Dict] = None
-    ) -> Dict[str, Any]:
+        params: Optional[Dict],
+        data: Optional[Dict],
+        headers: Optional[Dict]
+    ) -> Tuple[str, Dict, Optional[bytes]]:
         """
-        ارسال درخواست HTTP با مدیریت خطا
+        آماده‌سازی مشترک درخواست (محدودیت نرخ، URL، احراز هویت و بدنه)
         
         Args:
             method: متد HTTP
@@ -178,7 +274,7 @@ class BaseExchange(ABC):
             headers: هدرها
             
         Returns:
-            Dict: پاسخ JSON
+            Tuple: (URL کامل, هدرها, بدنه سریال شده یا None)
         """
         await self._check_rate_limit()
         
@@ -189,18 +285,50 @@ class BaseExchange(ABC):
             headers = {}
         headers.update(self._get_auth_headers(method, endpoint, params, data))
         
+        # سریال‌سازی یک‌باره بدنه درخواست با orjson
+        content = None
+        if data is not None:
+            content = orjson.dumps(data)
+            headers.setdefault("Content-Type", "application/json")
+        
+        return url, headers, content
+    
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        headers: Optional[Dict] = None
+    ) -> Dict[str, Any]:
+        """
+        ارسال درخواست HTTP با مدیریت خطا
+        
+        Args:
+            method: متد HTTP
+            endpoint: نقطه پایانی API
+            params: پارامترهای URL
+            data: داده‌های POST
+            headers: هدرها
+            
+        Returns:
+            Dict: پاسخ JSON
+        """
+        url, headers, content = await self._build_request(method, endpoint, params, data, headers)
+        
         # تلاش مجدد در صورت خطا
         for attempt in range(self.retry_count):
             try:
-                response = await self.client.request(
+                response = await self._get_client().request(
                     method=method,
                     url=url,
                     params=params,
-                    json=data,
-                    headers=headers
+                    content=content,
+                    headers=headers,
+                    timeout=self.timeout
                 )
                 response.raise_for_status()
-                return response.json()
+                return orjson.loads(response.content)
             
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 429:  # Rate limit exceeded
@@ -217,16 +345,95 @@ class BaseExchange(ABC):
         
         raise Exception("Max retry attempts reached")
     
-    async def _check_rate_limit(self):
-        """بررسی محدودیت نرخ درخواست"""
-        now = datetime.now()
-        time_diff = (now - self.last_request_time).total_seconds()
-        min_interval = 60 / self.rate_limit_per_minute
+    async def _make_request_stream(
+        self,
+        method: str,
+        endpoint: str,
+        prefixes: Tuple[str, ...],
+        params: Optional[Dict] = None,
+        data: Optional[Dict] = None,
+        headers: Optional[Dict] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        ارسال درخواست HTTP و پردازش جریانی پاسخ JSON
+        
+        مقادیر مسیرهای prefixes به محض رسیدن بایت‌ها تولید می‌شوند و کل پاسخ
+        در حافظه ساخته نمی‌شود (بدون تلاش مجدد).
+        
+        Args:
+            method: متد HTTP
+            endpoint: نقطه پایانی API
+            prefixes: مسیرهای ijson (مثل ("status", "trades.item"))
+            params: پارامترهای URL
+            data: داده‌های POST
+            headers: هدرها
+            
+        Yields:
+            Tuple: (مسیر, مقدار) برای هر مقدار منطبق با یکی از prefixes
+        """
+        url, headers, content = await self._build_request(method, endpoint, params, data, headers)
+        
+        # تلاش مجدد (مانند _make_request) فقط تا پیش از تولید اولین مقدار؛
+        # خطای وسط جریان بدون تلاش مجدد گزارش می‌شود
+        started = False
+        for attempt in range(self.retry_count):
+            try:
+                async with self._get_client().stream(
+                    method,
+                    url,
+                    params=params,
+                    content=content,
+                    headers=headers,
+                    timeout=self.timeout
+                ) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    
+                    started = True
+                    async for item in _iter_json_paths(response, prefixes):
+                        yield item
+                return
+            
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 429:  # Rate limit exceeded
+                    wait_time = 60 / self.rate_limit_per_minute
+                    await asyncio.sleep(wait_time)
+                    continue
+                elif attempt == self.retry_count - 1:
+                    raise Exception(f"HTTP Error: {e.response.status_code} - {e.response.text}")
+            
+            except httpx.RequestError as e:
+                if started or attempt == self.retry_count - 1:
+                    raise Exception(f"Request Error: {str(e)}")
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff
         
-        if time_diff < min_interval:
-            await asyncio.sleep(min_interval - time_diff)
+        raise Exception("Max retry attempts reached")
+    
+    async def _check_rate_limit(self):
+        """بررسی محدودیت نرخ درخواست با الگوریتم سطل توکن"""
+        refill_rate = self.rate_limit_per_minute / 60
         
-        self.last_request_time = datetime.now()
+        while True:
+            async with self._rate_lock:
+                now = time.monotonic()
+                
+                # پر کردن سطل بر اساس زمان سپری شده
+                elapsed = now - self._refill_at
+                self._tokens = min(
+                    float(self.rate_limit_per_minute),
+                    self._tokens + elapsed * refill_rate
+                )
+                self._refill_at = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                
+                wait_time = (1 - self._tokens) / refill_rate
+            
+            # انتظار خارج از قفل تا بقیه درخواست‌ها مسدود نشوند
+            await asyncio.sleep(wait_time)
     
     @abstractmethod
     def _get_auth_headers(
@@ -250,6 +457,50 @@ class BaseExchange(ABC):
         """
         pass
     
+    def _get_cached_ticker(self, symbol: str) -> Optional[MarketPrice]:
+        """دریافت قیمت از کش در صورت معتبر بودن"""
+        cached = self._ticker_cache.get(symbol)
+        if cached and time.monotonic() - cached[0] < self.ticker_cache_ttl:
+            return cached[1]
+        return None
+    
+    def _set_cached_ticker(self, symbol: str, ticker: MarketPrice):
+        """ذخیره قیمت در کش"""
+        self._ticker_cache[symbol] = (time.monotonic(), ticker)
+    
+    def _get_cached_balance(self) -> Optional[Dict[str, float]]:
+        """دریافت موجودی از کش در صورت معتبر بودن"""
+        cached = self._balance_cache
+        if cached and time.monotonic() - cached[0] < self.balance_cache_ttl:
+            return dict(cached[1])
+        return None
+    
+    def _set_cached_balance(self, balance: Dict[str, float]):
+        """ذخیره موجودی در کش"""
+        self._balance_cache = (time.monotonic(), dict(balance))
+    
+    def _invalidate_balance_cache(self):
+        """باطل کردن کش موجودی (پس از ثبت یا لغو سفارش)"""
+        self._balance_cache = None
+    
+    def _get_cached_historical(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """دریافت کندل‌های تاریخی از کش در صورت معتبر بودن"""
+        cached = self._historical_cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.historical_cache_ttl:
+            return list(cached[1])
+        return None
+    
+    def _set_cached_historical(self, key: Tuple, candles: List[Dict[str, Any]]):
+        """ذخیره کندل‌های تاریخی در کش (همراه با حذف موارد منقضی)"""
+        now = time.monotonic()
+        expired = [
+            k for k, (stored_at, _) in self._historical_cache.items()
+            if now - stored_at >= self.historical_cache_ttl
+        ]
+        for k in expired:
+            del self._historical_cache[k]
+        self._historical_cache[key] = (now, list(candles))
+    
     def _normalize_symbol(self, symbol: str) -> str:
         """
         تبدیل نماد به فرمت استاندارد صرافی
@@ -299,9 +550,27 @@ class BaseExchange(ABC):
         Returns:
             float: کارمزد
         """
-        # کارمزد پیش‌فرض 0.1%
-        fee_rate = 0.001
-        return amount * price * fee_rate
+        return amount * price * (self._maker_fee if is_maker else self._taker_fee)
+    
+    def calculate_fees_vec(
+        self,
+        amounts: np.ndarray,
+        prices: np.ndarray,
+        is_maker: bool = False
+    ) -> np.ndarray:
+        """
+        محاسبه برداری کارمزد برای آرایه‌ای از معاملات (مثلاً در بک‌تست)
+        
+        Args:
+            amounts: آرایه مقادیر
+            prices: آرایه قیمت‌ها
+            is_maker: آیا maker است؟
+            
+        Returns:
+            np.ndarray: کارمزد هر معامله
+        """
+        fee_rate = self._maker_fee if is_maker else self._taker_fee
+        return np.asarray(amounts, dtype=np.float64) * np.asarray(prices, dtype=np.float64) * fee_rate
     
     async def get_trading_rules(self, symbol: str) -> Dict[str, Any]:
         """
@@ -313,11 +582,4 @@ class BaseExchange(ABC):
         Returns:
             Dict: قوانین معاملاتی
         """
-        return {
-            "min_qty": 0.00001,
-            "max_qty": 1000000,
-            "step_size": 0.00001,
-            "min_notional": 10,
-            "price_precision": 8,
-            "qty_precision": 8
-        }
\ No newline at end of file
+        return dict(DEFAULT_TRADING_RULES)
\ No newline at end of file
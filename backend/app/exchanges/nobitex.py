@@ -5,27 +5,57 @@ Nobitex Exchange Implementation
 import hmac
 import hashlib
 import time
-import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from contextlib import aclosing
+import orjson
+import numpy as np
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
 from .base import BaseExchange
+from ..config import settings
 from ..models.trading import MarketPrice, TradeExecutionResponse, TradeType, TradeStatus
 
+# جفت ارزهای پشتیبانی شده نوبیتکس
+NOBITEX_PAIRS: List[str] = [
+    "BTC/IRT", "ETH/IRT", "LTC/IRT", "XRP/IRT", "BCH/IRT",
+    "ADA/IRT", "EOS/IRT", "TRX/IRT", "BNB/IRT", "USDT/IRT",
+    "BTC/USDT", "ETH/USDT", "LTC/USDT", "XRP/USDT", "BCH/USDT",
+    "ADA/USDT", "EOS/USDT", "TRX/USDT", "BNB/USDT"
+]
+
+def _parse_symbol(symbol: str) -> Tuple[str, str, str, str]:
+    """تجزیه نماد استاندارد به (ارز پایه، ارز مقابل، "base-quote"، "basequote") با حروف کوچک"""
+    base, quote = symbol.lower().split("/")
+    return base, quote, f"{base}-{quote}", f"{base}{quote}"
+
+# نگاشت نماد استاندارد به فرمت‌های نوبیتکس (یک بار هنگام import)
+# "BTC/USDT" -> ("btc", "usdt", "btc-usdt", "btcusdt")
+_SYMBOL_MAP: Dict[str, Tuple[str, str, str, str]] = {
+    symbol: _parse_symbol(symbol) for symbol in (*NOBITEX_PAIRS, *settings.SUPPORTED_PAIRS)
+}
+
 class NobitexExchange(BaseExchange):
     """پیاده‌سازی API نوبیتکس"""
     
+    # کارمزد نوبیتکس معمولاً 0.35% است
+    _taker_fee = 0.0035
+    _maker_fee = 0.0035
+    
+    def __init__(self, api_key: str, secret: str, testnet: bool = False):
+        super().__init__(api_key, secret, testnet)
+        
+        # نمونه اولیه HMAC با کلید از پیش آماده (فقط copy در هر درخواست)؛
+        # instance عمومی (بدون کلید) فقط به endpointهای عمومی درخواست می‌دهد
+        self._hmac_proto = (
+            hmac.new(self.secret.encode(), b"", hashlib.sha256) if self.secret else None
+        )
+    
     @property
     def base_url(self) -> str:
         return "https://api.nobitex.ir"
     
     @property
     def supported_pairs(self) -> List[str]:
-        return [
-            "BTC/IRT", "ETH/IRT", "LTC/IRT", "XRP/IRT", "BCH/IRT",
-            "ADA/IRT", "EOS/IRT", "TRX/IRT", "BNB/IRT", "USDT/IRT",
-            "BTC/USDT", "ETH/USDT", "LTC/USDT", "XRP/USDT", "BCH/USDT",
-            "ADA/USDT", "EOS/USDT", "TRX/USDT", "BNB/USDT"
-        ]
+        return NOBITEX_PAIRS
     
     def _get_auth_headers(
         self,
@@ -35,11 +65,15 @@ class NobitexExchange(BaseExchange):
         data: Optional[Dict] = None
     ) -> Dict[str, str]:
         """تولید هدرهای احراز هویت نوبیتکس"""
-        timestamp = str(int(time.time() * 1000))
+        if self._hmac_proto is None:
+            return {}
+        
+        # زمان دیواری (میلی‌ثانیه) - سرور صرافی آن را بررسی می‌کند
+        timestamp = f"{time.time_ns() // 1_000_000}"
         
         # ایجاد payload برای امضا
         if data:
-            payload = json.dumps(data, separators=(',', ':'))
+            payload = orjson.dumps(data).decode()
         else:
             payload = ""
         
@@ -47,11 +81,9 @@ class NobitexExchange(BaseExchange):
         message = f"{timestamp}{method.upper()}/api{endpoint}{payload}"
         
         # امضای HMAC
-        signature = hmac.new(
-            self.secret.encode(),
-            message.encode(),
-            hashlib.sha256
-        ).hexdigest()
+        mac = self._hmac_proto.copy()
+        mac.update(message.encode())
+        signature = mac.hexdigest()
         
         return {
             "X-API-Key": self.api_key,
@@ -62,14 +94,18 @@ class NobitexExchange(BaseExchange):
     
     async def get_ticker(self, symbol: str) -> MarketPrice:
         """دریافت قیمت لحظه‌ای از نوبیتکس"""
+        cached = self._get_cached_ticker(symbol)
+        if cached is not None:
+            return cached
+        
         try:
             # تبدیل نماد به فرمت نوبیتکس
-            nobitex_symbol = self._normalize_symbol_for_nobitex(symbol)
+            base, quote, _, _ = self._split_symbol(symbol)
             
             # درخواست اطلاعات قیمت
             response = await self._make_request(
                 "GET",
-                f"/market/stats?srcCurrency={nobitex_symbol.split('-')[0]}&dstCurrency={nobitex_symbol.split('-')[1]}"
+                f"/market/stats?srcCurrency={base}&dstCurrency={quote}"
             )
             
             if response.get("status") != "ok":
@@ -82,19 +118,26 @@ class NobitexExchange(BaseExchange):
             # استخراج اطلاعات قیمت
             price_data = list(stats.values())[0] if stats else {}
             
-            return MarketPrice(
+            ticker = MarketPrice(
                 symbol=symbol,
                 price=float(price_data.get("latest", 0)),
                 timestamp=datetime.now(),
                 volume_24h=float(price_data.get("dayChange", 0)),
                 change_24h=float(price_data.get("dayChange", 0))
             )
+            self._set_cached_ticker(symbol, ticker)
+            
+            return ticker
             
         except Exception as e:
             raise Exception(f"Failed to get ticker for {symbol}: {str(e)}")
     
     async def get_balance(self) -> Dict[str, float]:
         """دریافت موجودی حساب"""
+        cached = self._get_cached_balance()
+        if cached is not None:
+            return cached
+        
         try:
             response = await self._make_request("POST", "/users/wallets/list")
             
@@ -108,6 +151,7 @@ class NobitexExchange(BaseExchange):
                 currency = wallet.get("currency", "").upper()
                 balance[currency] = float(wallet.get("balance", 0))
             
+            self._set_cached_balance(balance)
             return balance
             
         except Exception as e:
@@ -124,13 +168,13 @@ class NobitexExchange(BaseExchange):
         """ثبت سفارش در نوبیتکس"""
         try:
             # تبدیل نماد
-            base, quote = symbol.split("/")
+            base, quote, _, _ = self._split_symbol(symbol)
             
             # آماده‌سازی پارامترهای سفارش
             order_data = {
                 "type": side.value,
-                "srcCurrency": base.lower() if side == TradeType.SELL else quote.lower(),
-                "dstCurrency": quote.lower() if side == TradeType.SELL else base.lower(),
+                "srcCurrency": base if side == TradeType.SELL else quote,
+                "dstCurrency": quote if side == TradeType.SELL else base,
                 "amount": str(amount),
                 "execution": order_type
             }
@@ -144,6 +188,7 @@ class NobitexExchange(BaseExchange):
                 raise Exception(f"Order failed: {response.get('message', 'Unknown error')}")
             
             order = response.get("order", {})
+            self._invalidate_balance_cache()
             
             return TradeExecutionResponse(
                 success=True,
@@ -198,7 +243,11 @@ class NobitexExchange(BaseExchange):
                 data={"order": order_id}
             )
             
-            return response.get("status") == "ok"
+            if response.get("status") != "ok":
+                return False
+            
+            self._invalidate_balance_cache()
+            return True
             
         except Exception:
             return False
@@ -211,18 +260,23 @@ class NobitexExchange(BaseExchange):
         end_time: Optional[datetime] = None,
         limit: int = 500
     ) -> List[Dict[str, Any]]:
-        """دریافت داده‌های تاریخی"""
+        """دریافت داده‌های تاریخی (با کش ۵ دقیقه‌ای برای هر درخواست یکسان)"""
+        cache_key = (symbol, interval, start_time, end_time, limit)
+        cached = self._get_cached_historical(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # نوبیتکس فعلاً API کاملی برای historical data ندارد
             # اینجا یک پیاده‌سازی ساده ارائه می‌دهیم
             
             # تبدیل نماد
-            base, quote = symbol.split("/")
+            base, quote, _, _ = self._split_symbol(symbol)
             
             # درخواست داده‌های اخیر
             response = await self._make_request(
                 "GET",
-                f"/market/stats?srcCurrency={base.lower()}&dstCurrency={quote.lower()}"
+                f"/market/stats?srcCurrency={base}&dstCurrency={quote}"
             )
             
             if response.get("status") != "ok":
@@ -237,19 +291,38 @@ class NobitexExchange(BaseExchange):
                 current_price = float(price_data.get("latest", 0))
             
             # تولید داده‌های نمونه (در پروژه واقعی باید از منابع خارجی استفاده کرد)
-            historical_data = []
-            for i in range(limit):
-                timestamp = datetime.now() - timedelta(hours=i)
-                historical_data.append({
-                    "timestamp": timestamp.isoformat(),
-                    "open": current_price * (0.99 + 0.02 * (i % 10) / 10),
-                    "high": current_price * (1.01 + 0.02 * (i % 10) / 10),
-                    "low": current_price * (0.97 + 0.02 * (i % 10) / 10),
-                    "close": current_price * (0.98 + 0.04 * (i % 10) / 10),
-                    "volume": 1000 + (i * 50)
-                })
-            
-            return list(reversed(historical_data))  # مرتب‌سازی بر اساس زمان
+            # محاسبه برداری همه کندل‌ها، مرتب‌شده از قدیمی به جدید
+            offsets = np.arange(limit - 1, -1, -1)
+            step = 0.02 * (offsets % 10) / 10
+            
+            timestamps = np.datetime64(datetime.now(), "us") - offsets.astype("timedelta64[h]")
+            opens = current_price * (0.99 + step)
+            highs = current_price * (1.01 + step)
+            lows = current_price * (0.97 + step)
+            closes = current_price * (0.98 + 2 * step)
+            volumes = 1000 + offsets * 50
+            
+            candles = [
+                {
+                    "timestamp": ts,
+                    "open": o,
+                    "high": h,
+                    "low": l,
+                    "close": c,
+                    "volume": v
+                }
+                for ts, o, h, l, c, v in zip(
+                    np.datetime_as_string(timestamps, unit="us").tolist(),
+                    opens.tolist(),
+                    highs.tolist(),
+                    lows.tolist(),
+                    closes.tolist(),
+                    volumes.tolist()
+                )
+            ]
+            self._set_cached_historical(cache_key, candles)
+            
+            return candles
             
         except Exception as e:
             raise Exception(f"Failed to get historical data: {str(e)}")
@@ -257,16 +330,22 @@ class NobitexExchange(BaseExchange):
     def _normalize_symbol_for_nobitex(self, symbol: str) -> str:
         """تبدیل نماد به فرمت نوبیتکس"""
         # نوبیتکس از فرمت "BTC-IRT" استفاده می‌کند
-        base, quote = symbol.split("/")
-        return f"{base.lower()}-{quote.lower()}"
+        return self._split_symbol(symbol)[2]
+    
+    def _split_symbol(self, symbol: str) -> Tuple[str, str, str, str]:
+        """دریافت (ارز پایه، ارز مقابل، "base-quote"، "basequote") از نگاشت نمادها"""
+        parts = _SYMBOL_MAP.get(symbol)
+        if parts is None:
+            parts = _parse_symbol(symbol)
+        return parts
     
     async def get_orderbook(self, symbol: str) -> Dict[str, Any]:
         """دریافت کتاب سفارشات"""
         try:
-            base, quote = symbol.split("/")
+            compact_symbol = self._split_symbol(symbol)[3]
             response = await self._make_request(
                 "GET",
-                f"/market/orderbook?symbol={base.lower()}{quote.lower()}"
+                f"/market/orderbook?symbol={compact_symbol}"
             )
             
             if response.get("status") != "ok":
@@ -278,24 +357,34 @@ class NobitexExchange(BaseExchange):
             raise Exception(f"Failed to get orderbook: {str(e)}")
     
     async def get_recent_trades(self, symbol: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """دریافت آخرین معاملات"""
+        """دریافت آخرین معاملات (پردازش جریانی و توقف پس از limit معامله)"""
         try:
-            base, quote = symbol.split("/")
-            response = await self._make_request(
+            nobitex_symbol = self._split_symbol(symbol)[2]
+            
+            trades = []
+            status = None
+            message = None
+            stream = self._make_request_stream(
                 "GET",
-                f"/market/trades/{base.lower()}-{quote.lower()}"
+                f"/market/trades/{nobitex_symbol}",
+                ("status", "message", "trades.item")
             )
-            
-            if response.get("status") != "ok":
-                raise Exception("Failed to get recent trades")
-            
-            return response.get("trades", [])[:limit]
+            async with aclosing(stream):
+                async for path, value in stream:
+                    if path == "trades.item":
+                        trades.append(value)
+                        # توقف زودهنگام فقط پس از دیدن وضعیت پاسخ
+                        if len(trades) >= limit and status is not None:
+                            break
+                    elif path == "status":
+                        status = value
+                    else:
+                        message = value
+            
+            if status != "ok":
+                raise Exception(f"Nobitex API Error: {message or 'Unknown error'}")
+            
+            return trades[:limit]
             
         except Exception as e:
             raise Exception(f"Failed to get recent trades: {str(e)}")
-    
-    def calculate_fee(self, amount: float, price: float, is_maker: bool = False) -> float:
-        """محاسبه کارمزد نوبیتکس"""
-        # کارمزد نوبیتکس معمولاً 0.35% است
-        fee_rate = 0.0035
-        return amount * price * fee_rate
\ No newline at end of file
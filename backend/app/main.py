@@ -2,18 +2,25 @@
 ربات ترید حرفه‌ای - FastAPI Backend
 Professional Trading Bot - FastAPI Backend
 """
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from cachetools import TTLCache
 import asyncio
 import logging
+import numpy as np
+import orjson
 from datetime import datetime
 from typing import Dict, List, Optional
 
 from .config import settings
-from .database import get_db, create_tables, DatabaseManager
+from .database import (
+    get_db_manager, create_tables, DatabaseManager, trade_writer,
+    cache_get, cache_set, cache_delete, cache_publish, cache_listen, close_redis
+)
 from .security import security_manager
+# import در سطح ماژول: کرنل‌های Numba هنگام راه‌اندازی کامپایل/بارگذاری می‌شوند، نه در اولین درخواست
+from .strategies.ema_rsi import EmaRsiStrategy
 from .models.trading import (
     APICredentialsRequest, APICredentialsResponse,
     TradingSettingsRequest, TradingSignal,
@@ -31,7 +38,8 @@ app = FastAPI(
     version=settings.VERSION,
     description="ربات ترید حرفه‌ای با پشتیبانی از صرافی‌های ایرانی",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse  # سریال‌سازی JSON با orjson
 )
 
 # تنظیمات CORS
@@ -43,21 +51,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Cache برای exchange instances
-exchange_cache: Dict[str, any] = {}
+# Cache برای exchange instances (محدود و با انقضای خودکار)
+# TTL برابر با کش credentials در Redis تا کلید قدیمی بیش از آن در هیچ workerی نماند
+exchange_cache: TTLCache = TTLCache(maxsize=512, ttl=settings.CREDENTIAL_CACHE_TTL)
+
+# کانال pub/sub ابطال exchangeهای کش شده در همه workerها (پیام: کلید کش)
+_EXCHANGE_INVALIDATION_CHANNEL = "exch:invalidate"
+_invalidation_task: Optional[asyncio.Task] = None
+
+def _evict_exchange(cache_key: str):
+    """حذف exchange کش شده پس از تغییر credentials (در هر worker)"""
+    exchange_cache.pop(cache_key, None)
 
 # استراتژی‌های فعال
-active_strategies: Dict[str, any] = {}
+active_strategies: TTLCache = TTLCache(maxsize=512, ttl=3600)
+
+# پاسخ‌های آماده / و /health (هر ثانیه توسط یک task پس‌زمینه به‌روزرسانی می‌شوند)
+_root_snapshot: bytes = b""
+_health_snapshot: bytes = b""
+_snapshot_task: Optional[asyncio.Task] = None
+
+def _build_snapshots():
+    """ساخت و encode پاسخ‌های / و /health با زمان فعلی"""
+    global _root_snapshot, _health_snapshot
+    timestamp = datetime.now().isoformat()
+    
+    _root_snapshot = orjson.dumps({
+        "message": "Professional Trading Bot API",
+        "version": settings.VERSION,
+        "status": "running",
+        "supported_exchanges": settings.SUPPORTED_EXCHANGES,
+        "supported_pairs": settings.SUPPORTED_PAIRS,
+        "timestamp": timestamp
+    })
+    _health_snapshot = orjson.dumps({
+        "status": "healthy",
+        "timestamp": timestamp,
+        "database": "connected",
+        "cache_size": len(exchange_cache),
+        "active_strategies": len(active_strategies)
+    })
+
+async def _refresh_snapshots(interval: float = 1.0):
+    """به‌روزرسانی دوره‌ای پاسخ‌های آماده"""
+    while True:
+        _build_snapshots()
+        await asyncio.sleep(interval)
+
+_build_snapshots()
 
 @app.on_event("startup")
 async def startup_event():
     """راه‌اندازی اولیه برنامه"""
     logger.info("Starting Trading Bot Backend...")
     
+    # بررسی event loop (uvloop در uvicorn[standard] موجود است)
+    loop_type = type(asyncio.get_running_loop())
+    if loop_type.__module__.startswith("uvloop"):
+        logger.info("Event loop: uvloop")
+    else:
+        logger.warning(f"Event loop is {loop_type.__module__}.{loop_type.__name__}, not uvloop")
+    
     # ایجاد جداول دیتابیس
     await create_tables()
     logger.info("Database tables created/verified")
     
+    # شروع نویسنده پس‌زمینه تاریخچه معاملات
+    trade_writer.start()
+    
+    # instance عمومی نوبیتکس برای داده‌های بازار (بدون نیاز به کلید API)
+    from .exchanges.nobitex import NobitexExchange
+    app.state.public_exchange = NobitexExchange(None, None)
+    
+    # شروع به‌روزرسانی پاسخ‌های / و /health
+    global _snapshot_task
+    _snapshot_task = asyncio.create_task(_refresh_snapshots())
+    
+    # دریافت ابطال exchangeهای کش شده از سایر workerها
+    global _invalidation_task
+    _invalidation_task = asyncio.create_task(
+        cache_listen(_EXCHANGE_INVALIDATION_CHANNEL, _evict_exchange)
+    )
+    
     logger.info("Trading Bot Backend started successfully")
 
 @app.on_event("shutdown")
@@ -65,42 +140,41 @@ async def shutdown_event():
     """خاموش کردن برنامه"""
     logger.info("Shutting down Trading Bot Backend...")
     
-    # بستن اتصالات exchange
-    for exchange in exchange_cache.values():
-        if hasattr(exchange, '__aexit__'):
-            await exchange.__aexit__(None, None, None)
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+    if _invalidation_task is not None:
+        _invalidation_task.cancel()
+    
+    # ذخیره معاملات باقی‌مانده در صف
+    await trade_writer.stop()
+    
+    # instanceهای exchange اتصال جداگانه ندارند؛ فقط client HTTP مشترک بسته می‌شود
+    exchange_cache.clear()
+    
+    # بستن client HTTP مشترک صرافی‌ها
+    from .exchanges.base import BaseExchange
+    await BaseExchange.close_shared_client()
+    
+    await close_redis()
     
     logger.info("Trading Bot Backend shutdown complete")
 
 @app.get("/")
 async def root():
     """صفحه اصلی API"""
-    return {
-        "message": "Professional Trading Bot API",
-        "version": settings.VERSION,
-        "status": "running",
-        "supported_exchanges": settings.SUPPORTED_EXCHANGES,
-        "supported_pairs": settings.SUPPORTED_PAIRS,
-        "timestamp": datetime.now().isoformat()
-    }
+    return Response(content=_root_snapshot, media_type="application/json")
 
 @app.get("/health")
 async def health_check():
     """بررسی سلامت سیستم"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "database": "connected",
-        "cache_size": len(exchange_cache),
-        "active_strategies": len(active_strategies)
-    }
+    return Response(content=_health_snapshot, media_type="application/json")
 
 # === API Endpoints برای مدیریت کلیدهای API ===
 
 @app.post("/api/set-api", response_model=APICredentialsResponse)
 async def set_api_credentials(
     credentials: APICredentialsRequest,
-    db: AsyncSession = Depends(get_db)
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
     """
     ذخیره کلیدهای API کاربر برای صرافی انتخابی
@@ -115,8 +189,6 @@ async def set_api_credentials(
         encrypted_secret = security_manager.encrypt_secret(credentials.secret)
         
         # ذخیره در دیتابیس
-        db_manager = DatabaseManager(db)
-        
         # بررسی/ایجاد کاربر
         user = await db_manager.get_user_by_id(credentials.user_id)
         if not user:
@@ -131,9 +203,10 @@ async def set_api_credentials(
         )
         
         # حذف از cache تا مجدداً لود شود
-        cache_key = f"{credentials.user_id}:{credentials.exchange_name}"
-        if cache_key in exchange_cache:
-            del exchange_cache[cache_key]
+        cache_key = f"{security_manager.hash_user_id(credentials.user_id)}:{credentials.exchange_name}"
+        _evict_exchange(cache_key)
+        await cache_delete(f"exch:{cache_key}")
+        await cache_publish(_EXCHANGE_INVALIDATION_CHANNEL, cache_key)
         
         return APICredentialsResponse(
             success=True,
@@ -150,11 +223,11 @@ async def set_api_credentials(
 async def test_exchange_connection(
     user_id: str,
     exchange_name: str,
-    db: AsyncSession = Depends(get_db)
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
     """تست اتصال به صرافی"""
     try:
-        exchange = await get_exchange_instance(user_id, exchange_name, db)
+        exchange = await get_exchange_instance(user_id, exchange_name, db_manager)
         is_connected = await exchange.test_connection()
         
         if is_connected:
@@ -180,29 +253,49 @@ async def get_trade_signal(
     user_id: str,
     exchange_name: str,
     pair: str,
-    db: AsyncSession = Depends(get_db)
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ) -> TradingSignal:
     """دریافت سیگنال معاملاتی لحظه‌ای"""
     try:
         # بررسی پشتیبانی از جفت ارز
-        if pair not in settings.SUPPORTED_PAIRS:
+        if pair not in settings.SUPPORTED_PAIRS_SET:
             raise HTTPException(status_code=400, detail=f"Trading pair {pair} not supported")
         
         # دریافت exchange instance
-        exchange = await get_exchange_instance(user_id, exchange_name, db)
-        
-        # دریافت قیمت فعلی
-        market_price = await exchange.get_ticker(pair)
+        exchange = await get_exchange_instance(user_id, exchange_name, db_manager)
         
-        # دریافت یا ایجاد استراتژی
-        strategy = await get_strategy_instance(user_id, exchange_name, pair, db)
-        
-        # دریافت داده‌های تاریخی برای محاسبه شاخص‌ها
-        historical_data = await exchange.get_historical_data(pair, interval="1h", limit=100)
-        historical_prices = [float(candle.get('close', 0)) for candle in historical_data]
-        
-        # افزودن داده‌ها به استراتژی
-        strategy.add_price_data(historical_prices)
+        # قیمت فعلی و استراتژی به صورت همزمان دریافت می‌شوند
+        ticker_task = asyncio.create_task(exchange.get_ticker(pair))
+        strategy_task = asyncio.create_task(
+            get_strategy_instance(user_id, exchange_name, pair, db_manager)
+        )
+        hist_task = None
+        try:
+            strategy = await strategy_task
+            
+            # داده‌های تاریخی فقط برای seed اولیه شاخص‌ها لازم است؛
+            # پس از آن استراتژی هر قیمت جدید را به صورت افزایشی پردازش می‌کند.
+            # این درخواست همزمان با دریافت قیمت فعلی اجرا می‌شود.
+            if not strategy.is_seeded:
+                hist_task = asyncio.create_task(
+                    exchange.get_historical_data(pair, interval="1h", limit=100)
+                )
+                market_price, historical_data = await asyncio.gather(ticker_task, hist_task)
+                historical_prices = np.fromiter(
+                    (float(candle.get('close', 0.0)) for candle in historical_data),
+                    dtype=np.float64,
+                    count=len(historical_data)
+                )
+                strategy.add_price_data(historical_prices)
+            else:
+                market_price = await ticker_task
+        except BaseException:
+            # لغو درخواست‌های باقی‌مانده در صورت خطا
+            ticker_task.cancel()
+            strategy_task.cancel()
+            if hist_task is not None:
+                hist_task.cancel()
+            raise
         
         # تولید سیگنال
         signal = strategy.generate_signal(
@@ -211,7 +304,15 @@ async def get_trade_signal(
             exchange=exchange_name
         )
         
-        return signal
+        # اشتراک وضعیت شاخص‌ها با سایر workerها
+        await cache_set(
+            f"strat:{security_manager.hash_user_id(user_id)}:{exchange_name}:{pair}",
+            strategy.get_state(),
+            settings.STRATEGY_STATE_TTL
+        )
+        
+        # پاسخ مستقیم با orjson (بدون encode دوباره توسط FastAPI)
+        return ORJSONResponse(content=signal.model_dump())
         
     except Exception as e:
         logger.error(f"Failed to generate signal: {str(e)}")
@@ -220,7 +321,7 @@ async def get_trade_signal(
 @app.post("/api/execute-trade", response_model=TradeExecutionResponse)
 async def execute_trade(
     trade_request: TradeExecutionRequest,
-    db: AsyncSession = Depends(get_db)
+    db_manager: DatabaseManager = Depends(get_db_manager)
 ):
     """اجرای معامله واقعی"""
     try:
@@ -228,7 +329,7 @@ async def execute_trade(
         exchange = await get_exchange_instance(
             trade_request.user_id,
             trade_request.exchange_name,
-            db
+            db_manager
         )
         
         # اجرای معامله
@@ -241,7 +342,6 @@ async def execute_trade(
         
         # ذخیره در تاریخچه
         if result.success:
-            db_manager = DatabaseManager(db)
             await db_manager.save_trade(
                 user_id=trade_request.user_id,
                 exchange_name=trade_request.exchange_name,
@@ -261,21 +361,15 @@ async def execute_trade(
         raise HTTPException(status_code=500, detail=f"Trade execution failed: {str(e)}")
 
 @app.post("/api/backtest", response_model=BacktestResult)
-async def run_backtest(
-    backtest_request: BacktestRequest,
-    db: AsyncSession = Depends(get_db)
-):
-    """اجرای بک‌تست استراتژی"""
+async def run_backtest(backtest_request: BacktestRequest, request: Request):
+    """اجرای بک‌تست استراتژی (بدون نیاز به session دیتابیس)"""
     try:
-        # ایجاد exchange instance موقت برای دریافت داده‌ها
-        # در اینجا از نوبیتکس به عنوان پیش‌فرض استفاده می‌کنیم
-        from .exchanges.nobitex import NobitexExchange
-        
-        # برای بک‌تست نیازی به credentials واقعی نیست
-        temp_exchange = NobitexExchange("dummy_key", "dummy_secret")
+        # برای بک‌تست نیازی به credentials واقعی نیست؛
+        # از instance عمومی نوبیتکس ساخته شده در startup استفاده می‌شود
+        public_exchange = request.app.state.public_exchange
         
         # دریافت داده‌های تاریخی
-        historical_data = await temp_exchange.get_historical_data(
+        historical_data = await public_exchange.get_historical_data(
             symbol=backtest_request.trading_pair,
             interval="1h",
             start_time=backtest_request.start_date,
@@ -283,13 +377,10 @@ async def run_backtest(
             limit=1000
         )
         
-        await temp_exchange.__aexit__(None, None, None)  # بستن اتصال
-        
         if not historical_data:
             raise HTTPException(status_code=400, detail="No historical data available")
         
         # ایجاد استراتژی برای بک‌تست
-        from .strategies.ema_rsi import EmaRsiStrategy
         strategy = EmaRsiStrategy(
             ema_short_period=backtest_request.ema_short_period,
             ema_long_period=backtest_request.ema_long_period,
@@ -302,28 +393,41 @@ async def run_backtest(
         results = strategy.backtest(
             historical_prices=historical_data,
             initial_balance=backtest_request.initial_balance,
-            trade_amount_percent=backtest_request.trade_amount_percent
+            trade_amount_percent=backtest_request.trade_amount_percent,
+            include_balance_history=backtest_request.include_balance_history
         )
         
         # تبدیل به فرمت پاسخ
-        from .models.trading import BacktestTrade
+        # داده‌ها خروجی کرنل خودمان هستند؛ ساخت بدون اعتبارسنجی مجدد Pydantic
+        from .models.trading import BacktestTrade, TradeType
         trades = []
         for trade in results["trades"]:
-            bt_trade = BacktestTrade(
-                timestamp=trade["timestamp"],
-                trade_type=trade["type"],
+            timestamp = trade["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp)
+            
+            bt_trade = BacktestTrade.model_construct(
+                timestamp=timestamp,
+                trade_type=TradeType(trade["type"]),
                 price=trade["price"],
                 amount=trade["amount"],
                 total_value=trade["amount"] * trade["price"],
                 balance_after=trade["balance"],
-                profit_loss=trade.get("profit_loss", 0),
+                profit_loss=trade.get("profit_loss", 0.0),
                 ema_short=trade["ema_short"],
                 ema_long=trade["ema_long"],
                 rsi=trade["rsi"]
             )
             trades.append(bt_trade)
         
-        return BacktestResult(
+        # آمار سود/زیان در یک گذر برداری
+        pnl = np.array([t.profit_loss for t in trades], dtype=np.float64)
+        profits = pnl[pnl > 0]
+        losses = pnl[pnl < 0]
+        total_profit = float(profits.sum())
+        total_loss = float(losses.sum())
+        
+        result = BacktestResult(
             success=True,
             message="Backtest completed successfully",
             initial_balance=results["initial_balance"],
@@ -334,11 +438,11 @@ async def run_backtest(
             winning_trades=results["winning_trades"],
             losing_trades=results["losing_trades"],
             win_rate=results["win_rate"],
-            total_profit=sum(t.profit_loss for t in trades if t.profit_loss > 0),
-            total_loss=sum(t.profit_loss for t in trades if t.profit_loss < 0),
-            average_profit=sum(t.profit_loss for t in trades if t.profit_loss > 0) / max(results["winning_trades"], 1),
-            average_loss=sum(t.profit_loss for t in trades if t.profit_loss < 0) / max(results["losing_trades"], 1),
-            profit_factor=abs(sum(t.profit_loss for t in trades if t.profit_loss > 0) / sum(t.profit_loss for t in trades if t.profit_loss < 0)) if sum(t.profit_loss for t in trades if t.profit_loss < 0) != 0 else 0,
+            total_profit=total_profit,
+            total_loss=total_loss,
+            average_profit=float(profits.mean()) if profits.size else 0.0,
+            average_loss=float(losses.mean()) if losses.size else 0.0,
+            profit_factor=abs(total_profit / total_loss) if total_loss != 0 else 0,
             start_date=backtest_request.start_date,
             end_date=backtest_request.end_date,
             duration_days=(backtest_request.end_date - backtest_request.start_date).days,
@@ -346,30 +450,49 @@ async def run_backtest(
             balance_history=results["balance_history"]
         )
         
+        # پاسخ مستقیم با orjson (بدون encode دوباره توسط FastAPI)
+        return ORJSONResponse(content=result.model_dump())
+        
     except Exception as e:
         logger.error(f"Backtest failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Backtest failed: {str(e)}")
 
 # === توابع کمکی ===
 
-async def get_exchange_instance(user_id: str, exchange_name: str, db: AsyncSession):
+async def get_exchange_instance(user_id: str, exchange_name: str, db_manager: DatabaseManager):
     """دریافت یا ایجاد instance صرافی"""
-    cache_key = f"{user_id}:{exchange_name}"
+    # کلید کش بر اساس هش شناسه کاربر (طول ثابت، بدون نگهداری شناسه خام)
+    cache_key = f"{security_manager.hash_user_id(user_id)}:{exchange_name}"
     
     # بررسی cache
     if cache_key in exchange_cache:
         return exchange_cache[cache_key]
     
-    # دریافت credentials از دیتابیس
-    db_manager = DatabaseManager(db)
-    credential = await db_manager.get_exchange_credentials(user_id, exchange_name)
-    
-    if not credential:
-        raise HTTPException(status_code=404, detail="Exchange credentials not found")
+    # کش مشترک Redis (کلیدها به همان صورت رمزنگاری شده نگهداری می‌شوند)
+    redis_key = f"exch:{cache_key}"
+    cached = await cache_get(redis_key)
+    if cached:
+        encrypted_api_key = cached["api_key"]
+        encrypted_secret = cached["secret"]
+    else:
+        # دریافت credentials از دیتابیس
+        credential = await db_manager.get_exchange_credentials(user_id, exchange_name)
+        
+        if not credential:
+            raise HTTPException(status_code=404, detail="Exchange credentials not found")
+        
+        encrypted_api_key = credential.encrypted_api_key
+        encrypted_secret = credential.encrypted_secret
+        await cache_set(
+            redis_key,
+            {"api_key": encrypted_api_key, "secret": encrypted_secret},
+            settings.CREDENTIAL_CACHE_TTL,
+            only_if_missing=True
+        )
     
     # رمزگشایی کلیدها
-    api_key = security_manager.decrypt_api_key(credential.encrypted_api_key)
-    secret = security_manager.decrypt_secret(credential.encrypted_secret)
+    api_key = security_manager.decrypt_api_key(encrypted_api_key)
+    secret = security_manager.decrypt_secret(encrypted_secret)
     
     # ایجاد exchange instance
     if exchange_name == "nobitex":
@@ -383,62 +506,69 @@ async def get_exchange_instance(user_id: str, exchange_name: str, db: AsyncSessi
     
     return exchange
 
-async def get_strategy_instance(user_id: str, exchange_name: str, pair: str, db: AsyncSession):
+async def get_strategy_instance(user_id: str, exchange_name: str, pair: str, db_manager: DatabaseManager):
     """دریافت یا ایجاد استراتژی"""
-    strategy_key = f"{user_id}:{exchange_name}:{pair}"
-    
-    # بررسی cache
-    if strategy_key in active_strategies:
-        return active_strategies[strategy_key]
+    strategy_key = f"{security_manager.hash_user_id(user_id)}:{exchange_name}:{pair}"
     
-    # ایجاد استراتژی جدید
-    from .strategies.ema_rsi import EmaRsiStrategy
-    strategy = EmaRsiStrategy()
+    # بررسی cache محلی (در صورت نبود، استراتژی جدید ساخته می‌شود)
+    strategy = active_strategies.get(strategy_key)
+    if strategy is None:
+        strategy = EmaRsiStrategy()
+        active_strategies[strategy_key] = strategy
     
-    # ذخیره در cache
-    active_strategies[strategy_key] = strategy
+    # وضعیت کش مشترک فقط اگر worker دیگری آن را بعد از نسخه محلی به‌روز کرده باشد جایگزین می‌شود
+    state = await cache_get(f"strat:{strategy_key}")
+    if state and state.get("updated_at", 0.0) > strategy.updated_at:
+        strategy.load_state(state)
     
     return strategy
 
 # === API Endpoints اضافی ===
 
+# پاسخ‌های ثابت یک بار هنگام import به JSON تبدیل می‌شوند
+_EXCHANGES_BODY = orjson.dumps({
+    "exchanges": [
+        {
+            "name": "nobitex",
+            "display_name": "نوبیتکس",
+            "status": "active",
+            "supported_pairs": ["BTC/IRT", "ETH/IRT", "USDT/IRT", "BTC/USDT", "ETH/USDT"]
+        },
+        {
+            "name": "wallex",
+            "display_name": "والکس",
+            "status": "coming_soon",
+            "supported_pairs": []
+        },
+        {
+            "name": "ramzinex",
+            "display_name": "رمزینکس", 
+            "status": "coming_soon",
+            "supported_pairs": []
+        }
+    ]
+})
+
+_TRADING_PAIRS_BODY = orjson.dumps({
+    "pairs": settings.SUPPORTED_PAIRS,
+    "categories": {
+        "irt_pairs": settings.IRT_PAIRS,
+        "usdt_pairs": settings.USDT_PAIRS
+    }
+})
+
 @app.get("/api/exchanges")
 async def get_supported_exchanges():
     """لیست صرافی‌های پشتیبانی شده"""
-    return {
-        "exchanges": [
-            {
-                "name": "nobitex",
-                "display_name": "نوبیتکس",
-                "status": "active",
-                "supported_pairs": ["BTC/IRT", "ETH/IRT", "USDT/IRT", "BTC/USDT", "ETH/USDT"]
-            },
-            {
-                "name": "wallex",
-                "display_name": "والکس",
-                "status": "coming_soon",
-                "supported_pairs": []
-            },
-            {
-                "name": "ramzinex",
-                "display_name": "رمزینکس", 
-                "status": "coming_soon",
-                "supported_pairs": []
-            }
-        ]
-    }
+    return Response(content=_EXCHANGES_BODY, media_type="application/json")
 
 @app.get("/api/trading-pairs")
 async def get_trading_pairs():
     """لیست جفت ارزهای پشتیبانی شده"""
-    return {
-        "pairs": settings.SUPPORTED_PAIRS,
-        "categories": {
-            "irt_pairs": [pair for pair in settings.SUPPORTED_PAIRS if "/IRT" in pair],
-            "usdt_pairs": [pair for pair in settings.SUPPORTED_PAIRS if "/USDT" in pair]
-        }
-    }
+    return Response(content=_TRADING_PAIRS_BODY, media_type="application/json")
 
 if __name__ == "__main__":
     import uvicorn
+    # loop/http روی auto: در صورت نصب uvicorn[standard] از uvloop/httptools استفاده می‌شود
+    # و روی Windows (بدون uvloop) به asyncio برمی‌گردد؛ پرچم‌های صریح فقط در Dockerfile
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -35,7 +35,7 @@ class APICredentialsRequest(BaseModel):
     @validator('exchange_name')
     def validate_exchange_name(cls, v):
         from ..config import settings
-        if v.lower() not in settings.SUPPORTED_EXCHANGES:
+        if v.lower() not in settings.SUPPORTED_EXCHANGES_SET:
             raise ValueError(f'Exchange not supported. Supported: {settings.SUPPORTED_EXCHANGES}')
         return v.lower()
     
@@ -90,7 +90,7 @@ class TradingSettingsRequest(BaseModel):
     @validator('trading_pair')
     def validate_trading_pair(cls, v):
         from ..config import settings
-        if v not in settings.SUPPORTED_PAIRS:
+        if v not in settings.SUPPORTED_PAIRS_SET:
             raise ValueError(f'Trading pair not supported. Supported: {settings.SUPPORTED_PAIRS}')
         return v
 
@@ -191,6 +191,9 @@ class BacktestRequest(BaseModel):
     rsi_oversold: float = Field(default=30.0, ge=10.0, le=50.0)
     
     trade_amount_percent: float = Field(default=10.0, ge=1.0, le=100.0)
+    
+    # تاریخچه موجودی به ازای هر کندل (برای بک‌تست‌های طولانی قابل غیرفعال شدن)
+    include_balance_history: bool = True
 
 class BacktestTrade(BaseModel):
     """معامله در بک‌تست"""
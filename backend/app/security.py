@@ -2,14 +2,60 @@
 ماژول امنیتی برای رمزنگاری کلیدهای API
 Security module for encrypting API keys and secrets
 """
+from cryptography.exceptions import InvalidTag
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.backends import default_backend
 import base64
+import functools
+import hashlib
 import os
+import re
 import secrets
-from typing import str, bytes
+
+from .config import settings
+
+# cipherهای پیش‌فرض یک بار هنگام import ساخته می‌شوند (آماده‌سازی کلید فقط یک بار)
+_DEFAULT_AESGCM = AESGCM(settings.ENCRYPTION_KEY)
+# Fernet فقط برای رمزگشایی مقادیر ذخیره شده با فرمت قبلی نگه داشته می‌شود
+_DEFAULT_FERNET = Fernet(base64.urlsafe_b64encode(settings.ENCRYPTION_KEY))
+
+# طول nonce در AES-GCM (بایت)
+_NONCE_SIZE = 12
+
+# پیشوند base64 نسخه توکن Fernet (بایت 0x80)؛ توکن‌های قدیمی یک بار دیگر base64 شده‌اند
+_FERNET_TOKEN_PREFIX = b"gAAAAA"
+
+# الگوی مجاز کلید/Secret (حروف، اعداد، - و _ با طول 10 تا 500)
+_API_RE = re.compile(r"\A[A-Za-z0-9_\-]{10,500}\Z")
+
+@functools.lru_cache(maxsize=8)
+def _derive_key(password: str, salt: bytes) -> bytes:
+    """
+    استخراج کلید ۳۲ بایتی از رمز عبور با PBKDF2 (نتیجه برای هر جفت رمز/salt کش می‌شود)
+    
+    Args:
+        password: رمز عبور
+        salt: salt ثابت KDF
+        
+    Returns:
+        bytes: کلید خام
+    """
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+        backend=default_backend()
+    )
+    return kdf.derive(password.encode())
+
+@functools.lru_cache(maxsize=4096)
+def _hash_uid(user_id: str) -> str:
+    """هش SHA-256 شناسه کاربر (تعداد کاربران فعال کم است، نتیجه کش می‌شود)"""
+    return hashlib.sha256(user_id.encode()).hexdigest()
 
 class SecurityManager:
     """مدیریت امنیتی و رمزنگاری"""
@@ -22,46 +68,30 @@ class SecurityManager:
             master_key: کلید اصلی برای رمزنگاری (اختیاری)
         """
         if master_key:
-            self.fernet = self._create_fernet_from_password(master_key)
+            key = _derive_key(master_key, settings.KDF_SALT)
+            self.aesgcm = AESGCM(key)
+            self.fernet = Fernet(base64.urlsafe_b64encode(key))
         else:
-            # استفاده از کلید پیش‌فرض از تنظیمات
-            self.fernet = Fernet(self._derive_key_from_config())
-    
-    def _create_fernet_from_password(self, password: str, salt: bytes = None) -> Fernet:
-        """ایجاد کلید Fernet از رمز عبور"""
-        if salt is None:
-            salt = os.urandom(16)
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        return Fernet(key)
-    
-    def _derive_key_from_config(self) -> bytes:
-        """استخراج کلید از تنظیمات"""
-        from .config import settings
-        return base64.urlsafe_b64encode(settings.ENCRYPTION_KEY)
+            # استفاده از cipherهای پیش‌فرض ساخته شده از تنظیمات
+            self.aesgcm = _DEFAULT_AESGCM
+            self.fernet = _DEFAULT_FERNET
     
     def encrypt_api_key(self, api_key: str) -> str:
         """
-        رمزنگاری کلید API
+        رمزنگاری کلید API با AES-GCM
         
         Args:
             api_key: کلید API خام
             
         Returns:
-            str: کلید رمزنگاری شده در فرمت base64
+            str: nonce + متن رمز شده در فرمت base64
         """
         if not api_key:
             raise ValueError("API key cannot be empty")
         
-        encrypted_data = self.fernet.encrypt(api_key.encode())
-        return base64.urlsafe_b64encode(encrypted_data).decode()
+        nonce = os.urandom(_NONCE_SIZE)
+        encrypted_data = self.aesgcm.encrypt(nonce, api_key.encode(), None)
+        return base64.urlsafe_b64encode(nonce + encrypted_data).decode()
     
     def decrypt_api_key(self, encrypted_key: str) -> str:
         """
@@ -77,12 +107,23 @@ class SecurityManager:
             raise ValueError("Encrypted key cannot be empty")
         
         try:
-            encrypted_data = base64.urlsafe_b64decode(encrypted_key.encode())
-            decrypted_data = self.fernet.decrypt(encrypted_data)
+            data = base64.urlsafe_b64decode(encrypted_key.encode())
+            try:
+                decrypted_data = self.aesgcm.decrypt(data[:_NONCE_SIZE], data[_NONCE_SIZE:], None)
+            except InvalidTag:
+                # مقادیر ذخیره شده قبلی با Fernet رمز شده‌اند
+                decrypted_data = self._decrypt_legacy(encrypted_key)
             return decrypted_data.decode()
         except Exception as e:
             raise ValueError(f"Failed to decrypt API key: {str(e)}")
     
+    def _decrypt_legacy(self, encrypted_key: str) -> bytes:
+        """رمزگشایی توکن‌های Fernet (با یا بدون base64 اضافه)"""
+        token = encrypted_key.encode()
+        if not token.startswith(_FERNET_TOKEN_PREFIX):
+            token = base64.urlsafe_b64decode(token)
+        return self.fernet.decrypt(token)
+    
     def encrypt_secret(self, secret: str) -> str:
         """رمزنگاری Secret (مشابه API key)"""
         return self.encrypt_api_key(secret)
@@ -103,24 +144,15 @@ class SecurityManager:
     
     def hash_user_id(self, user_id: str) -> str:
         """هش کردن شناسه کاربر برای امنیت بیشتر"""
-        import hashlib
-        return hashlib.sha256(user_id.encode()).hexdigest()
+        return _hash_uid(user_id)
     
     def validate_api_credentials(self, api_key: str, secret: str) -> bool:
         """اعتبارسنجی اولیه کلیدهای API"""
-        if not api_key or not secret:
-            return False
-        
-        # بررسی طول مینیمم
-        if len(api_key) < 10 or len(secret) < 10:
-            return False
-        
-        # بررسی کاراکترهای مجاز
-        allowed_chars = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
-        if not set(api_key).issubset(allowed_chars) or not set(secret).issubset(allowed_chars):
-            return False
-        
-        return True
+        return bool(
+            api_key and secret
+            and _API_RE.match(api_key)
+            and _API_RE.match(secret)
+        )
 
 # Instance سراسری برای استفاده در سرتاسر برنامه
 security_manager = SecurityManager()
\ No newline at end of file
@@ -0,0 +1,408 @@
+"""
+کرنل‌های عددی شاخص‌های تکنیکال (کامپایل شده با Numba)
+Numba-compiled numeric kernels for technical indicators
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # بدون Numba همان توابع به صورت پایتون خالص اجرا می‌شوند
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        
+        def decorator(func):
+            return func
+        return decorator
+
+@njit(cache=True)
+def ema(prices, period):
+    """
+    میانگین متحرک نمایی (معادل ewm(span=period, adjust=False) در pandas)
+    
+    Args:
+        prices: آرایه float64 قیمت‌ها
+        period: دوره EMA
+    
+    Returns:
+        np.ndarray: مقادیر EMA
+    """
+    n = prices.shape[0]
+    out = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return out
+    
+    alpha = 2.0 / (period + 1.0)
+    out[0] = prices[0]
+    for i in range(1, n):
+        out[i] = alpha * prices[i] + (1.0 - alpha) * out[i - 1]
+    return out
+
+@njit(cache=True)
+def rsi_value(avg_gain, avg_loss):
+    """تبدیل میانگین سود/زیان به RSI"""
+    if avg_loss == 0.0:
+        return 100.0 if avg_gain > 0.0 else 50.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+@njit(cache=True)
+def wilder_rsi(prices, period):
+    """
+    شاخص قدرت نسبی با هموارسازی Wilder
+    
+    میانگین اولیه سود/زیان از period تغییر اول (SMA) گرفته می‌شود و
+    مقادیر قبل از آن خنثی (50) هستند.
+    
+    Args:
+        prices: آرایه float64 قیمت‌ها
+        period: دوره RSI
+    
+    Returns:
+        np.ndarray: مقادیر RSI
+    """
+    n = prices.shape[0]
+    out = np.full(n, 50.0)
+    if n <= period:
+        return out
+    
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, period + 1):
+        delta = prices[i] - prices[i - 1]
+        if delta > 0.0:
+            avg_gain += delta
+        else:
+            avg_loss -= delta
+    avg_gain /= period
+    avg_loss /= period
+    out[period] = rsi_value(avg_gain, avg_loss)
+    
+    for i in range(period + 1, n):
+        delta = prices[i] - prices[i - 1]
+        gain = delta if delta > 0.0 else 0.0
+        loss = -delta if delta < 0.0 else 0.0
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        out[i] = rsi_value(avg_gain, avg_loss)
+    return out
+
+@njit(cache=True)
+def tick_update(prev_ema_short, prev_ema_long, prev_avg_gain, prev_avg_loss,
+                price, prev_price, alpha_short, alpha_long, rsi_period):
+    """
+    به‌روزرسانی افزایشی EMAها و RSI (Wilder) با یک قیمت جدید در یک فراخوانی
+    
+    Returns:
+        Tuple: (EMA کوتاه, EMA بلند, میانگین سود, میانگین زیان, RSI)
+    """
+    ema_short = alpha_short * price + (1.0 - alpha_short) * prev_ema_short
+    ema_long = alpha_long * price + (1.0 - alpha_long) * prev_ema_long
+    
+    delta = price - prev_price
+    gain = delta if delta > 0.0 else 0.0
+    loss = -delta if delta < 0.0 else 0.0
+    avg_gain = (prev_avg_gain * (rsi_period - 1) + gain) / rsi_period
+    avg_loss = (prev_avg_loss * (rsi_period - 1) + loss) / rsi_period
+    return ema_short, ema_long, avg_gain, avg_loss, rsi_value(avg_gain, avg_loss)
+
+@njit(cache=True)
+def _ema_rsi_pass(prices, alpha_short, alpha_long, rsi_period):
+    """بدنه مشترک کرنل ترکیبی EMA/RSI (ضرایب EMA از قبل محاسبه شده)"""
+    n = prices.shape[0]
+    ema_short = np.empty(n, dtype=np.float64)
+    ema_long = np.empty(n, dtype=np.float64)
+    rsi = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return ema_short, ema_long, rsi, 0.0, 0.0
+    
+    # هر سه آرایه خروجی فقط یک بار و در همین گذر نوشته می‌شوند
+    ema_s = prices[0]
+    ema_l = prices[0]
+    ema_short[0] = ema_s
+    ema_long[0] = ema_l
+    rsi[0] = 50.0
+    
+    avg_gain = 0.0
+    avg_loss = 0.0
+    prev_price = prices[0]
+    for i in range(1, n):
+        price = prices[i]
+        ema_s = alpha_short * price + (1.0 - alpha_short) * ema_s
+        ema_l = alpha_long * price + (1.0 - alpha_long) * ema_l
+        ema_short[i] = ema_s
+        ema_long[i] = ema_l
+        
+        delta = price - prev_price
+        prev_price = price
+        if i <= rsi_period:
+            # میانگین ساده period تغییر اول (seed)
+            if delta > 0.0:
+                avg_gain += delta
+            else:
+                avg_loss -= delta
+            if i == rsi_period:
+                avg_gain /= rsi_period
+                avg_loss /= rsi_period
+                rsi[i] = rsi_value(avg_gain, avg_loss)
+            else:
+                rsi[i] = 50.0
+        else:
+            gain = delta if delta > 0.0 else 0.0
+            loss = -delta if delta < 0.0 else 0.0
+            avg_gain = (avg_gain * (rsi_period - 1) + gain) / rsi_period
+            avg_loss = (avg_loss * (rsi_period - 1) + loss) / rsi_period
+            rsi[i] = rsi_value(avg_gain, avg_loss)
+    
+    return ema_short, ema_long, rsi, avg_gain, avg_loss
+
+@njit(cache=True)
+def ema_rsi_bulk(prices, ema_short_period, ema_long_period, rsi_period):
+    """
+    محاسبه یک‌جای EMA کوتاه، EMA بلند و RSI در یک گذر روی قیمت‌ها
+    
+    هر سه شاخص در همان حلقه به‌روزرسانی می‌شوند تا آرایه قیمت فقط یک بار
+    خوانده شود؛ فرمول‌ها همان فرمول‌های ema، wilder_rsi و به‌روزرسانی‌های
+    افزایشی هستند و نتایج دقیقاً یکسان است.
+    
+    Args:
+        prices: آرایه float64 قیمت‌ها (برای وضعیت نهایی RSI حداقل rsi_period + 1 عنصر)
+        ema_short_period: دوره EMA کوتاه
+        ema_long_period: دوره EMA بلند
+        rsi_period: دوره RSI
+    
+    Returns:
+        Tuple: (EMA کوتاه, EMA بلند, RSI, میانگین سود نهایی, میانگین زیان نهایی)
+    """
+    return _ema_rsi_pass(
+        prices,
+        2.0 / (ema_short_period + 1.0),
+        2.0 / (ema_long_period + 1.0),
+        rsi_period
+    )
+
+# دوره‌های پیش‌فرض استراتژی؛ نسخه اختصاصی آن‌ها با امضای صریح هنگام import کامپایل می‌شود
+DEFAULT_PERIODS = (12, 26, 14)
+
+@njit("Tuple((float64[:], float64[:], float64[:], float64, float64))(float64[:])", cache=True)
+def ema_rsi_default(prices):
+    """
+    کرنل ترکیبی EMA(12)، EMA(26) و RSI(14) با ثابت‌های از پیش تعیین شده
+    
+    Args:
+        prices: آرایه float64 قیمت‌ها
+    
+    Returns:
+        Tuple: همان خروجی ema_rsi_bulk
+    """
+    return _ema_rsi_pass(prices, 2.0 / 13.0, 2.0 / 27.0, 14)
+
+def ema_rsi(prices, ema_short_period, ema_long_period, rsi_period):
+    """
+    انتخاب کرنل ترکیبی: نسخه از پیش کامپایل شده برای دوره‌های پیش‌فرض، در غیر این صورت نسخه عمومی
+    
+    Returns:
+        Tuple: (EMA کوتاه, EMA بلند, RSI, میانگین سود نهایی, میانگین زیان نهایی)
+    """
+    if (ema_short_period, ema_long_period, rsi_period) == DEFAULT_PERIODS:
+        return ema_rsi_default(prices)
+    return ema_rsi_bulk(prices, ema_short_period, ema_long_period, rsi_period)
+
+# کدهای سیگنال و حالت تحلیل (خروجی analyze_core)
+SIGNAL_HOLD = 0
+SIGNAL_BUY = 1
+SIGNAL_SELL = -1
+CASE_MIXED = 0
+CASE_STRONG = 1
+CASE_WEAK = 2
+
+# ساختار هر معامله در خروجی backtest_loop
+BACKTEST_TRADE_DTYPE = np.dtype([
+    ("ts_idx", np.int64),
+    ("type", np.int8),
+    ("price", np.float64),
+    ("amount", np.float64),
+    ("balance", np.float64),
+    ("pnl", np.float64),
+    ("ema_s", np.float64),
+    ("ema_l", np.float64),
+    ("rsi", np.float64),
+    ("confidence", np.float64),
+])
+
+@njit(cache=True)
+def analyze_core(ema_short, ema_long, rsi, prev_ema_short, prev_ema_long, rsi_oversold, rsi_overbought):
+    """
+    بخش عددی تحلیل سیگنال EMA + RSI (بدون ساخت پیام)
+    
+    Returns:
+        Tuple: (کد سیگنال, اطمینان, crossover: 1 طلایی / -1 مرگ / 0, کد حالت)
+    """
+    confidence = 0.0
+    
+    ema_bullish = ema_short > ema_long
+    ema_bearish = ema_short < ema_long
+    is_oversold = rsi < rsi_oversold
+    is_overbought = rsi > rsi_overbought
+    
+    # تایید crossover
+    cross = 0
+    if prev_ema_short <= prev_ema_long and ema_bullish:
+        cross = 1
+        confidence += 25.0
+    elif prev_ema_short >= prev_ema_long and ema_bearish:
+        cross = -1
+        confidence += 25.0
+    
+    # قدرت EMA (فاصله) و RSI (فاصله از حد) فقط در حالت‌های قوی لازم است
+    if ema_bullish and is_oversold:
+        signal = SIGNAL_BUY
+        case = CASE_STRONG
+        ema_diff_percent = (ema_short - ema_long) / ema_long * 100.0 if ema_long > 0.0 else 0.0
+        rsi_extreme_strength = (rsi_oversold - rsi) / rsi_oversold * 100.0
+        confidence += 40.0 + min(ema_diff_percent * 2.0, 20.0) + min(rsi_extreme_strength, 15.0)
+    elif ema_bearish and is_overbought:
+        signal = SIGNAL_SELL
+        case = CASE_STRONG
+        ema_diff_percent = (ema_long - ema_short) / ema_long * 100.0 if ema_long > 0.0 else 0.0
+        rsi_extreme_strength = (rsi - rsi_overbought) / (100.0 - rsi_overbought) * 100.0
+        confidence += 40.0 + min(ema_diff_percent * 2.0, 20.0) + min(rsi_extreme_strength, 15.0)
+    elif ema_bullish and rsi < 50.0:
+        signal = SIGNAL_BUY
+        case = CASE_WEAK
+        confidence += 20.0
+    elif ema_bearish and rsi > 50.0:
+        signal = SIGNAL_SELL
+        case = CASE_WEAK
+        confidence += 20.0
+    else:
+        signal = SIGNAL_HOLD
+        case = CASE_MIXED
+        confidence = 30.0
+    
+    return signal, min(confidence, 100.0), cross, case
+
+# آستانه‌های پیش‌فرض RSI؛ تحلیل‌گر اختصاصی آن‌ها با امضای صریح هنگام import کامپایل می‌شود
+DEFAULT_RSI_THRESHOLDS = (30.0, 70.0)
+
+@njit("Tuple((int64, float64, int64, int64))(float64, float64, float64, float64, float64)", cache=True)
+def analyze_default(ema_short, ema_long, rsi, prev_ema_short, prev_ema_long):
+    """analyze_core با آستانه‌های ثابت 30/70 (ثابت‌ها در زمان کامپایل جایگذاری می‌شوند)"""
+    return analyze_core(ema_short, ema_long, rsi, prev_ema_short, prev_ema_long, 30.0, 70.0)
+
+def analyzer_for(rsi_oversold, rsi_overbought):
+    """
+    انتخاب تحلیل‌گر عددی برای آستانه‌های RSI یک استراتژی (یک بار هنگام ساخت)
+    
+    Returns:
+        Callable: تابع (ema_short, ema_long, rsi, prev_ema_short, prev_ema_long) -> خروجی analyze_core
+    """
+    if (float(rsi_oversold), float(rsi_overbought)) == DEFAULT_RSI_THRESHOLDS:
+        return analyze_default
+    
+    rsi_oversold = float(rsi_oversold)
+    rsi_overbought = float(rsi_overbought)
+    
+    def analyze(ema_short, ema_long, rsi, prev_ema_short, prev_ema_long):
+        return analyze_core(ema_short, ema_long, rsi, prev_ema_short, prev_ema_long, rsi_oversold, rsi_overbought)
+    return analyze
+
+@njit(cache=True)
+def backtest_loop(
+    prices, ema_short, ema_long, rsi, start,
+    rsi_oversold, rsi_overbought, min_confidence,
+    initial_balance, trade_amount_percent,
+    trades, balance_history
+):
+    """
+    حلقه بک‌تست روی آرایه قیمت‌ها
+    
+    معاملات در trades (آرایه BACKTEST_TRADE_DTYPE) و وضعیت هر کندل از
+    start به بعد در balance_history (ستون‌ها: موجودی، ارزش موقعیت، ارزش کل)
+    نوشته می‌شوند.
+    
+    Returns:
+        Tuple: (تعداد معاملات, موجودی نهایی, موقعیت نهایی)
+    """
+    balance = initial_balance
+    position = 0.0
+    entry_price = 0.0
+    count = 0
+    
+    for i in range(start, prices.shape[0]):
+        price = prices[i]
+        signal, confidence, cross, case = analyze_core(
+            ema_short[i], ema_long[i], rsi[i],
+            ema_short[i - 1], ema_long[i - 1],
+            rsi_oversold, rsi_overbought
+        )
+        
+        if signal == SIGNAL_BUY and confidence >= min_confidence and position == 0.0:
+            trade_amount = balance * (trade_amount_percent / 100.0)
+            if trade_amount > 0.0:
+                position = trade_amount / price
+                balance -= trade_amount
+                entry_price = price
+                
+                trade = trades[count]
+                trade["ts_idx"] = i
+                trade["type"] = SIGNAL_BUY
+                trade["price"] = price
+                trade["amount"] = position
+                trade["balance"] = balance
+                trade["pnl"] = 0.0
+                trade["ema_s"] = ema_short[i]
+                trade["ema_l"] = ema_long[i]
+                trade["rsi"] = rsi[i]
+                trade["confidence"] = confidence
+                count += 1
+        
+        elif signal == SIGNAL_SELL and confidence >= min_confidence and position > 0.0:
+            trade_value = position * price
+            balance += trade_value
+            entry_cost = position * entry_price
+            
+            trade = trades[count]
+            trade["ts_idx"] = i
+            trade["type"] = SIGNAL_SELL
+            trade["price"] = price
+            trade["amount"] = position
+            trade["balance"] = balance
+            trade["pnl"] = trade_value - entry_cost
+            trade["ema_s"] = ema_short[i]
+            trade["ema_l"] = ema_long[i]
+            trade["rsi"] = rsi[i]
+            trade["confidence"] = confidence
+            count += 1
+            
+            position = 0.0
+        
+        j = i - start
+        balance_history[j, 0] = balance
+        balance_history[j, 1] = position * price
+        balance_history[j, 2] = balance + position * price
+    
+    return count, balance, position
+
+def _warmup():
+    """
+    فراخوانی یک‌باره کرنل‌ها با آرایه‌های کوچک هنگام import
+    
+    app.main این ماژول را (از طریق strategies.ema_rsi) در سطح ماژول import
+    می‌کند، پس کامپایل (یا بارگذاری از کش دیسک) هنگام راه‌اندازی worker
+    انجام می‌شود، نه در اولین درخواست بک‌تست یا سیگنال.
+    """
+    prices = np.linspace(100.0, 110.0, 32)
+    ema(prices, 12)
+    wilder_rsi(prices, 14)
+    ema_short, ema_long, rsi, avg_gain, avg_loss = ema_rsi_bulk(prices, 5, 10, 7)
+    tick_update(ema_short[-1], ema_long[-1], avg_gain, avg_loss, 111.0, prices[-1], 2.0 / 6.0, 2.0 / 11.0, 7)
+    
+    trades = np.empty(prices.shape[0], dtype=BACKTEST_TRADE_DTYPE)
+    balance_history = np.empty((prices.shape[0], 3), dtype=np.float64)
+    backtest_loop(
+        prices, ema_short, ema_long, rsi, 10,
+        30.0, 70.0, 60.0, 1000.0, 10.0,
+        trades, balance_history[:prices.shape[0] - 10]
+    )
+
+_warmup()
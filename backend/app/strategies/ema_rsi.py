@@ -2,13 +2,15 @@
 استراتژی معاملاتی EMA + RSI
 EMA + RSI Trading Strategy Implementation
 """
+import time
 import numpy as np
-import pandas as pd
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Union
 from datetime import datetime, timedelta
 from enum import Enum
+from collections import deque
 
 from ..models.trading import TradingSignal, TechnicalIndicators, TradeType, SignalStrength
+from . import _kernels
 
 class SignalType(Enum):
     """نوع سیگنال"""
@@ -51,92 +53,254 @@ class EmaRsiStrategy:
         self.rsi_oversold = rsi_oversold
         self.min_confidence = min_confidence
         
-        # حافظه داده‌های قیمتی
-        self.price_history: List[float] = []
+        # تحلیل‌گر عددی اختصاصی آستانه‌های RSI این استراتژی
+        self._analyze_core = _kernels.analyzer_for(rsi_oversold, rsi_overbought)
+        
+        # حافظه داده‌های قیمتی (بافر حلقوی float64 با اندازه ثابت)
         self.max_history_length = max(ema_long_period, rsi_period) * 3
+        
+        # حداقل تعداد قیمت برای seed شدن شاخص‌ها (یک بار محاسبه می‌شود)
+        self._warmup_length = max(ema_long_period, rsi_period) + 1
+        self._history_buf = np.empty(self.max_history_length, dtype=np.float64)
+        self._history_head = 0
+        self._history_count = 0
+        
+        # وضعیت افزایشی شاخص‌ها (پس از seed فقط قیمت‌های جدید پردازش می‌شوند)
+        self._alpha_short = 2.0 / (ema_short_period + 1)
+        self._alpha_long = 2.0 / (ema_long_period + 1)
+        self.is_seeded = False
+        self.last_ema_short = 0.0
+        self.last_ema_long = 0.0
+        self.last_avg_gain = 0.0
+        self.last_avg_loss = 0.0
+        self.last_rsi = 50.0
+        self.last_price = 0.0
+        
+        # سه مقدار اخیر هر شاخص برای تشخیص crossover
+        self._recent_ema_short: deque = deque(maxlen=3)
+        self._recent_ema_long: deque = deque(maxlen=3)
+        self._recent_rsi: deque = deque(maxlen=3)
+        
+        # زمان آخرین تغییر وضعیت (برای تشخیص وضعیت جدیدتر در کش مشترک workerها)
+        self.updated_at = 0.0
     
-    def add_price_data(self, prices: List[float]):
+    @property
+    def price_history(self) -> np.ndarray:
+        """قیمت‌های نگهداری شده به ترتیب زمانی (قدیمی‌ترین اول)"""
+        return np.concatenate(self._history_segments())
+    
+    def _history_segments(self) -> Tuple[np.ndarray, np.ndarray]:
+        """دو view بدون کپی از بافر حلقوی که پشت سر هم ترتیب زمانی را می‌سازند"""
+        if self._history_count < self.max_history_length:
+            return self._history_buf[:self._history_count], self._history_buf[:0]
+        
+        head = self._history_head
+        return self._history_buf[head:], self._history_buf[:head]
+    
+    def _append_history(self, prices: np.ndarray):
+        """نوشتن قیمت‌ها در بافر حلقوی (قدیمی‌ترین‌ها بازنویسی می‌شوند)"""
+        capacity = self.max_history_length
+        n = prices.shape[0]
+        if n >= capacity:
+            self._history_buf[:] = prices[-capacity:]
+            self._history_head = 0
+            self._history_count = capacity
+            return
+        
+        head = self._history_head
+        end = head + n
+        if end <= capacity:
+            self._history_buf[head:end] = prices
+        else:
+            split = capacity - head
+            self._history_buf[head:] = prices[:split]
+            self._history_buf[:end - capacity] = prices[split:]
+        
+        self._history_head = end % capacity
+        self._history_count = min(self._history_count + n, capacity)
+    
+    def add_price_data(self, prices):
         """
         افزودن داده‌های قیمتی جدید
         
+        تا قبل از seed شدن، قیمت‌ها جمع می‌شوند و به محض کافی بودن داده
+        وضعیت شاخص‌ها یک‌جا محاسبه می‌شود؛ پس از آن هر قیمت با به‌روزرسانی
+        افزایشی O(1) پردازش می‌شود.
+        
         Args:
-            prices: لیست قیمت‌های جدید
+            prices: قیمت‌های جدید (np.ndarray از نوع float64 یا لیست)
         """
-        self.price_history.extend(prices)
+        prices = np.asarray(prices, dtype=np.float64)
         
-        # محدود کردن تاریخچه
-        if len(self.price_history) > self.max_history_length:
-            self.price_history = self.price_history[-self.max_history_length:]
+        if self.is_seeded:
+            for price in prices.tolist():
+                self._update_indicators(price)
+        else:
+            # seed روی کل داده‌های موجود انجام می‌شود، نه فقط بخش نگهداری شده در بافر
+            if self._history_count:
+                prices = np.concatenate((*self._history_segments(), prices))
+            self._try_seed(prices)
+            self._history_head = 0
+            self._history_count = 0
+            self._append_history(prices)
+            self.updated_at = time.time()
     
-    def calculate_ema(self, prices: List[float], period: int) -> List[float]:
+    def _try_seed(self, prices: np.ndarray):
+        """محاسبه یک‌جای وضعیت اولیه شاخص‌ها در صورت کافی بودن داده"""
+        if prices.shape[0] < self._warmup_length:
+            return
+        
+        ema_short, ema_long, rsi, avg_gain, avg_loss = _kernels.ema_rsi(
+            prices, self.ema_short_period, self.ema_long_period, self.rsi_period
+        )
+        
+        self.last_ema_short = float(ema_short[-1])
+        self.last_ema_long = float(ema_long[-1])
+        self.last_avg_gain = float(avg_gain)
+        self.last_avg_loss = float(avg_loss)
+        self.last_rsi = float(rsi[-1])
+        self.last_price = float(prices[-1])
+        
+        self._recent_ema_short.extend(ema_short[-3:].tolist())
+        self._recent_ema_long.extend(ema_long[-3:].tolist())
+        self._recent_rsi.extend(rsi[-3:].tolist())
+        self.is_seeded = True
+    
+    def _update_indicators(self, price: float):
+        """به‌روزرسانی افزایشی EMAها و RSI با یک قیمت جدید"""
+        (
+            self.last_ema_short, self.last_ema_long,
+            self.last_avg_gain, self.last_avg_loss, self.last_rsi
+        ) = _kernels.tick_update(
+            self.last_ema_short, self.last_ema_long,
+            self.last_avg_gain, self.last_avg_loss,
+            price, self.last_price,
+            self._alpha_short, self._alpha_long, self.rsi_period
+        )
+        self.last_price = price
+        
+        self._recent_ema_short.append(self.last_ema_short)
+        self._recent_ema_long.append(self.last_ema_long)
+        self._recent_rsi.append(self.last_rsi)
+        
+        self._history_buf[self._history_head] = price
+        self._history_head = (self._history_head + 1) % self.max_history_length
+        self._history_count = min(self._history_count + 1, self.max_history_length)
+        self.updated_at = time.time()
+    
+    def get_state(self) -> Dict[str, Any]:
+        """
+        بردار وضعیت قابل سریال‌سازی شاخص‌ها (برای اشتراک بین workerها)
+        
+        Returns:
+            Dict: وضعیت فعلی شاخص‌ها
+        """
+        older, newer = self._history_segments()
+        return {
+            "is_seeded": self.is_seeded,
+            "price_history": older.tolist() + newer.tolist(),
+            "last_ema_short": self.last_ema_short,
+            "last_ema_long": self.last_ema_long,
+            "last_avg_gain": self.last_avg_gain,
+            "last_avg_loss": self.last_avg_loss,
+            "last_rsi": self.last_rsi,
+            "last_price": self.last_price,
+            "recent_ema_short": list(self._recent_ema_short),
+            "recent_ema_long": list(self._recent_ema_long),
+            "recent_rsi": list(self._recent_rsi),
+            "updated_at": self.updated_at
+        }
+    
+    def load_state(self, state: Dict[str, Any]):
+        """
+        بازیابی وضعیت شاخص‌ها از خروجی get_state
+        
+        Args:
+            state: وضعیت ذخیره شده
+        """
+        self.is_seeded = state["is_seeded"]
+        self._history_head = 0
+        self._history_count = 0
+        self._append_history(np.asarray(state["price_history"], dtype=np.float64))
+        self.last_ema_short = state["last_ema_short"]
+        self.last_ema_long = state["last_ema_long"]
+        self.last_avg_gain = state["last_avg_gain"]
+        self.last_avg_loss = state["last_avg_loss"]
+        self.last_rsi = state["last_rsi"]
+        self.last_price = state["last_price"]
+        self._recent_ema_short = deque(state["recent_ema_short"], maxlen=3)
+        self._recent_ema_long = deque(state["recent_ema_long"], maxlen=3)
+        self._recent_rsi = deque(state["recent_rsi"], maxlen=3)
+        self.updated_at = state.get("updated_at", 0.0)
+    
+    def calculate_ema(self, prices: Union[List[float], np.ndarray], period: int) -> np.ndarray:
         """
         محاسبه میانگین متحرک نمایی (EMA)
         
         Args:
-            prices: قیمت‌ها
+            prices: قیمت‌ها (لیست یا آرایه float64؛ آرایه بدون کپی استفاده می‌شود)
             period: دوره محاسبه
             
         Returns:
-            List[float]: مقادیر EMA
+            np.ndarray: مقادیر EMA
         """
-        if len(prices) < period:
-            return [0] * len(prices)
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.shape[0] < period:
+            return np.zeros(prices.shape[0])
         
-        df = pd.DataFrame({'price': prices})
-        ema = df['price'].ewm(span=period, adjust=False).mean()
-        return ema.tolist()
+        return _kernels.ema(prices, period)
     
-    def calculate_rsi(self, prices: List[float], period: int = 14) -> List[float]:
+    def calculate_rsi(self, prices: Union[List[float], np.ndarray], period: int = 14) -> np.ndarray:
         """
-        محاسبه شاخص قدرت نسبی (RSI)
+        محاسبه شاخص قدرت نسبی (RSI) با هموارسازی Wilder
         
         Args:
-            prices: قیمت‌ها
+            prices: قیمت‌ها (لیست یا آرایه float64؛ آرایه بدون کپی استفاده می‌شود)
             period: دوره محاسبه
             
         Returns:
-            List[float]: مقادیر RSI
+            np.ndarray: مقادیر RSI (تا قبل از period + 1 قیمت مقدار خنثی 50)
         """
-        if len(prices) < period + 1:
-            return [50.0] * len(prices)  # مقدار خنثی
-        
-        # محاسبه تغییرات قیمت
-        deltas = np.diff(prices)
-        
-        # جداسازی سود و زیان
-        gains = np.where(deltas > 0, deltas, 0)
-        losses = np.where(deltas < 0, -deltas, 0)
-        
-        # میانگین سود و زیان
-        avg_gains = pd.Series(gains).rolling(window=period, min_periods=1).mean()
-        avg_losses = pd.Series(losses).rolling(window=period, min_periods=1).mean()
-        
-        # محاسبه RS و RSI
-        rs = avg_gains / avg_losses
-        rsi = 100 - (100 / (1 + rs))
-        
-        # اضافه کردن مقدار اول (RSI برای اولین قیمت تعریف نیست)
-        rsi = np.concatenate([[50.0], rsi.values])
-        
-        return rsi.tolist()
+        # هموارسازی Wilder در کرنل کامپایل شده
+        return _kernels.wilder_rsi(np.asarray(prices, dtype=np.float64), period)
     
     def calculate_indicators(
         self, 
-        prices: List[float]
-    ) -> Tuple[List[float], List[float], List[float]]:
+        prices: Union[List[float], np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """
         محاسبه همه شاخص‌های تکنیکال
         
         Args:
             prices: قیمت‌ها
             
+        Returns:
+            Tuple: (EMA کوتاه, EMA بلند, RSI) به صورت آرایه float64
+        """
+        return self._indicator_arrays(np.asarray(prices, dtype=np.float64))
+    
+    def _indicator_arrays(self, prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        محاسبه همه شاخص‌ها به صورت آرایه float64 (یک گذر با کرنل ترکیبی)
+        
+        Args:
+            prices: آرایه قیمت‌ها
+            
         Returns:
             Tuple: (EMA کوتاه, EMA بلند, RSI)
         """
-        ema_short = self.calculate_ema(prices, self.ema_short_period)
-        ema_long = self.calculate_ema(prices, self.ema_long_period)
-        rsi = self.calculate_rsi(prices, self.rsi_period)
+        n = prices.shape[0]
+        if n < max(self.ema_short_period, self.ema_long_period) or n < self.rsi_period + 1:
+            # داده ناکافی: همان مقادیر پیش‌فرض محاسبات جداگانه (EMA صفر، RSI خنثی)
+            return (
+                self.calculate_ema(prices, self.ema_short_period),
+                self.calculate_ema(prices, self.ema_long_period),
+                self.calculate_rsi(prices, self.rsi_period)
+            )
         
+        ema_short, ema_long, rsi, _, _ = _kernels.ema_rsi(
+            prices, self.ema_short_period, self.ema_long_period, self.rsi_period
+        )
         return ema_short, ema_long, rsi
     
     def generate_signal(
@@ -156,37 +320,45 @@ class EmaRsiStrategy:
         Returns:
             TradingSignal: سیگنال تولید شده
         """
-        # افزودن قیمت جدید
-        self.price_history.append(current_price)
+        # افزودن قیمت جدید؛ پس از seed مستقیماً به‌روزرسانی افزایشی O(1) بدون ساخت آرایه
+        if self.is_seeded:
+            self._update_indicators(float(current_price))
+        else:
+            self.add_price_data([current_price])
         
         # بررسی حداقل داده مورد نیاز
-        if len(self.price_history) < max(self.ema_long_period, self.rsi_period) + 1:
+        if not self.is_seeded:
             return self._create_hold_signal(current_price, symbol, exchange, "Insufficient data")
         
-        # محاسبه شاخص‌ها
-        ema_short, ema_long, rsi = self.calculate_indicators(self.price_history)
-        
         # مقادیر فعلی شاخص‌ها
-        current_ema_short = ema_short[-1]
-        current_ema_long = ema_long[-1]
-        current_rsi = rsi[-1]
+        current_ema_short = self.last_ema_short
+        current_ema_long = self.last_ema_long
+        current_rsi = self.last_rsi
         
-        # تشکیل indicators object
+        # تشکیل indicators object (یک زمان مشترک برای شاخص‌ها و سیگنال)
+        now = datetime.now()
         indicators = TechnicalIndicators(
             ema_short=current_ema_short,
             ema_long=current_ema_long,
             rsi=current_rsi,
-            timestamp=datetime.now()
+            timestamp=now
         )
         
+        # مقادیر قبلی EMA برای تشخیص crossover (با کمتر از سه مقدار اخیر بررسی نمی‌شود)
+        if len(self._recent_ema_short) >= 3 and len(self._recent_ema_long) >= 3:
+            prev_ema_short = self._recent_ema_short[-2]
+            prev_ema_long = self._recent_ema_long[-2]
+        else:
+            prev_ema_short = None
+            prev_ema_long = None
+        
         # تولید سیگنال
         signal_type, strength, confidence, message = self._analyze_signals(
             current_ema_short, 
             current_ema_long, 
             current_rsi,
-            ema_short,
-            ema_long,
-            rsi
+            prev_ema_short,
+            prev_ema_long
         )
         
         return TradingSignal(
@@ -198,7 +370,7 @@ class EmaRsiStrategy:
             indicators=indicators,
             confidence=confidence,
             message=message,
-            timestamp=datetime.now()
+            timestamp=now
         )
     
     def _analyze_signals(
@@ -206,9 +378,8 @@ class EmaRsiStrategy:
         ema_short: float,
         ema_long: float, 
         rsi: float,
-        ema_short_history: List[float],
-        ema_long_history: List[float],
-        rsi_history: List[float]
+        prev_ema_short: Optional[float] = None,
+        prev_ema_long: Optional[float] = None
     ) -> Tuple[SignalType, SignalStrength, float, str]:
         """
         تحلیل سیگنال‌ها و تعیین نوع معامله
@@ -217,100 +388,27 @@ class EmaRsiStrategy:
             ema_short: EMA کوتاه فعلی
             ema_long: EMA بلند فعلی
             rsi: RSI فعلی
-            ema_short_history: تاریخچه EMA کوتاه
-            ema_long_history: تاریخچه EMA بلند
-            rsi_history: تاریخچه RSI
+            prev_ema_short: EMA کوتاه کندل قبل (None: بدون بررسی crossover)
+            prev_ema_long: EMA بلند کندل قبل (None: بدون بررسی crossover)
             
         Returns:
             Tuple: (نوع سیگنال, قدرت, اطمینان, پیام)
         """
-        confidence = 0.0
-        message_parts = []
-        
-        # بررسی سیگنال خرید
-        ema_bullish = ema_short > ema_long
-        rsi_oversold = rsi < self.rsi_oversold
-        
-        # بررسی سیگنال فروش
-        ema_bearish = ema_short < ema_long
-        rsi_overbought = rsi > self.rsi_overbought
-        
-        # محاسبه قدرت سیگنال EMA (بر اساس فاصله)
-        ema_diff_percent = abs(ema_short - ema_long) / ema_long * 100 if ema_long > 0 else 0
-        
-        # محاسبه قدرت سیگنال RSI (بر اساس فاصله از حد)
-        rsi_extreme_strength = 0
-        if rsi_oversold:
-            rsi_extreme_strength = (self.rsi_oversold - rsi) / self.rsi_oversold * 100
-        elif rsi_overbought:
-            rsi_extreme_strength = (rsi - self.rsi_overbought) / (100 - self.rsi_overbought) * 100
-        
-        # بررسی تایید crossover
-        crossover_confirmed = False
-        if len(ema_short_history) >= 3 and len(ema_long_history) >= 3:
-            # بررسی تغییر جهت EMA در ۳ کندل اخیر
-            prev_ema_short = ema_short_history[-2]
-            prev_ema_long = ema_long_history[-2]
-            
-            # Golden Cross (صعودی)
-            if (prev_ema_short <= prev_ema_long) and (ema_short > ema_long):
-                crossover_confirmed = True
-                confidence += 25
-                message_parts.append("EMA Golden Cross")
-            
-            # Death Cross (نزولی)
-            elif (prev_ema_short >= prev_ema_long) and (ema_short < ema_long):
-                crossover_confirmed = True
-                confidence += 25
-                message_parts.append("EMA Death Cross")
-        
-        # تعیین سیگنال خرید
-        if ema_bullish and rsi_oversold:
-            signal_type = SignalType.BUY
-            confidence += 40  # سیگنال اصلی
-            confidence += min(ema_diff_percent * 2, 20)  # قدرت EMA
-            confidence += min(rsi_extreme_strength, 15)  # قدرت RSI
-            
-            message_parts.extend([
-                f"EMA Bullish ({ema_short:.2f} > {ema_long:.2f})",
-                f"RSI Oversold ({rsi:.1f})"
-            ])
+        # در صورت نبود مقدار قبلی، مقدار فعلی جای آن می‌نشیند تا crossover تشخیص داده نشود
+        if prev_ema_short is None or prev_ema_long is None:
+            prev_ema_short = ema_short
+            prev_ema_long = ema_long
         
-        # تعیین سیگنال فروش
-        elif ema_bearish and rsi_overbought:
-            signal_type = SignalType.SELL
-            confidence += 40  # سیگنال اصلی
-            confidence += min(ema_diff_percent * 2, 20)  # قدرت EMA
-            confidence += min(rsi_extreme_strength, 15)  # قدرت RSI
-            
-            message_parts.extend([
-                f"EMA Bearish ({ema_short:.2f} < {ema_long:.2f})",
-                f"RSI Overbought ({rsi:.1f})"
-            ])
+        signal_code, confidence, cross, case = self._analyze_core(
+            ema_short, ema_long, rsi, prev_ema_short, prev_ema_long
+        )
         
-        # سیگنال‌های ضعیف‌تر
-        elif ema_bullish and rsi < 50:
+        if signal_code == _kernels.SIGNAL_BUY:
             signal_type = SignalType.BUY
-            confidence += 20
-            message_parts.extend([
-                f"EMA Bullish ({ema_short:.2f} > {ema_long:.2f})",
-                f"RSI Neutral-Low ({rsi:.1f})"
-            ])
-        
-        elif ema_bearish and rsi > 50:
+        elif signal_code == _kernels.SIGNAL_SELL:
             signal_type = SignalType.SELL
-            confidence += 20
-            message_parts.extend([
-                f"EMA Bearish ({ema_short:.2f} < {ema_long:.2f})",
-                f"RSI Neutral-High ({rsi:.1f})"
-            ])
-        
         else:
             signal_type = SignalType.HOLD
-            confidence = 30
-            message_parts.append(
-                f"Mixed Signals - EMA: {ema_short:.2f}/{ema_long:.2f}, RSI: {rsi:.1f}"
-            )
         
         # تعیین قدرت سیگنال
         if confidence >= 80:
@@ -320,10 +418,50 @@ class EmaRsiStrategy:
         else:
             strength = SignalStrength.WEAK
         
-        # ترکیب پیام
-        message = " + ".join(message_parts)
+        message = self._format_message(signal_code, cross, case, ema_short, ema_long, rsi)
         
-        return signal_type, strength, min(confidence, 100), message
+        return signal_type, strength, float(confidence), message
+    
+    def _format_message(
+        self,
+        signal_code: int,
+        cross: int,
+        case: int,
+        ema_short: float,
+        ema_long: float,
+        rsi: float
+    ) -> str:
+        """
+        ساخت پیام متنی سیگنال از خروجی عددی analyze_core
+        
+        فقط برای سیگنالی که واقعاً برگردانده می‌شود فراخوانی می‌شود؛ مسیرهای
+        عددی (مانند بک‌تست) پیام نمی‌سازند.
+        
+        Returns:
+            str: پیام سیگنال
+        """
+        message_parts = []
+        if cross == 1:
+            message_parts.append("EMA Golden Cross")
+        elif cross == -1:
+            message_parts.append("EMA Death Cross")
+        
+        if signal_code == _kernels.SIGNAL_BUY:
+            message_parts.append(f"EMA Bullish ({ema_short:.2f} > {ema_long:.2f})")
+            message_parts.append(
+                f"RSI Oversold ({rsi:.1f})" if case == _kernels.CASE_STRONG else f"RSI Neutral-Low ({rsi:.1f})"
+            )
+        elif signal_code == _kernels.SIGNAL_SELL:
+            message_parts.append(f"EMA Bearish ({ema_short:.2f} < {ema_long:.2f})")
+            message_parts.append(
+                f"RSI Overbought ({rsi:.1f})" if case == _kernels.CASE_STRONG else f"RSI Neutral-High ({rsi:.1f})"
+            )
+        else:
+            message_parts.append(
+                f"Mixed Signals - EMA: {ema_short:.2f}/{ema_long:.2f}, RSI: {rsi:.1f}"
+            )
+        
+        return " + ".join(message_parts)
     
     def _create_hold_signal(
         self, 
@@ -333,6 +471,7 @@ class EmaRsiStrategy:
         reason: str
     ) -> TradingSignal:
         """ایجاد سیگنال نگهداری"""
+        now = datetime.now()
         return TradingSignal(
             symbol=symbol,
             exchange=exchange,
@@ -343,18 +482,19 @@ class EmaRsiStrategy:
                 ema_short=None,
                 ema_long=None,
                 rsi=None,
-                timestamp=datetime.now()
+                timestamp=now
             ),
             confidence=0,
             message=f"HOLD: {reason}",
-            timestamp=datetime.now()
+            timestamp=now
         )
     
     def backtest(
         self,
         historical_prices: List[Dict[str, Any]],
         initial_balance: float = 1000.0,
-        trade_amount_percent: float = 10.0
+        trade_amount_percent: float = 10.0,
+        include_balance_history: bool = True
     ) -> Dict[str, Any]:
         """
         بک‌تست استراتژی روی داده‌های تاریخی
@@ -363,98 +503,85 @@ class EmaRsiStrategy:
             historical_prices: داده‌های تاریخی قیمت
             initial_balance: موجودی اولیه
             trade_amount_percent: درصد موجودی برای هر معامله
+            include_balance_history: ساخت تاریخچه موجودی به ازای هر کندل (در غیر این صورت لیست خالی)
             
         Returns:
             Dict: نتایج بک‌تست
         """
-        balance = initial_balance
-        position = 0  # موجودی ارز
-        trades = []
-        balance_history = []
-        
         # استخراج قیمت‌های بسته شدن
-        prices = [float(candle.get('close', 0)) for candle in historical_prices]
+        prices = np.fromiter(
+            (float(candle.get('close', 0)) for candle in historical_prices),
+            dtype=np.float64,
+            count=len(historical_prices)
+        )
         
         # محاسبه شاخص‌ها برای همه داده‌ها
-        ema_short, ema_long, rsi = self.calculate_indicators(prices)
+        ema_short, ema_long, rsi = self._indicator_arrays(prices)
+        
+        # حلقه اصلی در کرنل کامپایل شده اجرا می‌شود
+        start = self._warmup_length - 1
+        steps = max(len(prices) - start, 0)
+        trades_arr = np.empty(steps, dtype=_kernels.BACKTEST_TRADE_DTYPE)
+        history_arr = np.empty((steps, 3), dtype=np.float64)
+        
+        trade_count, balance, position = _kernels.backtest_loop(
+            prices, ema_short, ema_long, rsi, start,
+            float(self.rsi_oversold), float(self.rsi_overbought), float(self.min_confidence),
+            float(initial_balance), float(trade_amount_percent),
+            trades_arr, history_arr
+        )
         
-        for i in range(max(self.ema_long_period, self.rsi_period), len(prices)):
-            current_price = prices[i]
-            current_ema_short = ema_short[i]
-            current_ema_long = ema_long[i]
-            current_rsi = rsi[i]
-            
-            # تولید سیگنال
-            signal_type, strength, confidence, message = self._analyze_signals(
-                current_ema_short,
-                current_ema_long, 
-                current_rsi,
-                ema_short[:i+1],
-                ema_long[:i+1],
-                rsi[:i+1]
-            )
-            
-            # اجرای معامله بر اساس سیگنال
-            if signal_type == SignalType.BUY and confidence >= self.min_confidence and position == 0:
-                # خرید
-                trade_amount = balance * (trade_amount_percent / 100)
-                if trade_amount > 0:
-                    position = trade_amount / current_price
-                    balance -= trade_amount
-                    
-                    trades.append({
-                        "timestamp": historical_prices[i].get("timestamp", datetime.now()),
-                        "type": "buy",
-                        "price": current_price,
-                        "amount": position,
-                        "balance": balance,
-                        "ema_short": current_ema_short,
-                        "ema_long": current_ema_long,
-                        "rsi": current_rsi,
-                        "confidence": confidence
-                    })
-            
-            elif signal_type == SignalType.SELL and confidence >= self.min_confidence and position > 0:
-                # فروش
-                trade_value = position * current_price
-                balance += trade_value
-                
-                profit_loss = trade_value - (position * trades[-1]["price"] if trades else 0)
-                
-                trades.append({
-                    "timestamp": historical_prices[i].get("timestamp", datetime.now()),
-                    "type": "sell",
-                    "price": current_price,
-                    "amount": position,
-                    "balance": balance,
-                    "profit_loss": profit_loss,
-                    "ema_short": current_ema_short,
-                    "ema_long": current_ema_long,
-                    "rsi": current_rsi,
-                    "confidence": confidence
-                })
-                
-                position = 0
-            
-            # ذخیره تاریخچه موجودی
-            total_value = balance + (position * current_price)
-            balance_history.append({
-                "timestamp": historical_prices[i].get("timestamp", datetime.now()),
-                "balance": balance,
-                "position_value": position * current_price,
-                "total_value": total_value
+        # زمان جایگزین برای کندل‌های بدون timestamp (یک بار، نه برای هر ردیف)
+        now = datetime.now()
+        
+        # شمارنده‌های آمار همزمان با ساخت معاملات (بدون پیمایش دوباره لیست)
+        trades = []
+        buy_count = 0
+        sell_count = 0
+        winning_trades = 0
+        for row in trades_arr[:trade_count].tolist():
+            ts_idx, type_code, price, amount, trade_balance, pnl, ema_s, ema_l, trade_rsi, confidence = row
+            trade = {
+                "timestamp": historical_prices[ts_idx].get("timestamp") or now,
+                "type": "buy" if type_code == _kernels.SIGNAL_BUY else "sell",
+                "price": price,
+                "amount": amount,
+                "balance": trade_balance
+            }
+            if type_code == _kernels.SIGNAL_SELL:
+                trade["profit_loss"] = pnl
+                sell_count += 1
+                if pnl > 0:
+                    winning_trades += 1
+            else:
+                buy_count += 1
+            trade.update({
+                "ema_short": ema_s,
+                "ema_long": ema_l,
+                "rsi": trade_rsi,
+                "confidence": confidence
             })
+            trades.append(trade)
+        
+        # تاریخچه موجودی (از آرایه از پیش تخصیص یافته کرنل؛ فقط در صورت درخواست به dict تبدیل می‌شود)
+        balance_history = []
+        if include_balance_history:
+            balance_history = [
+                {
+                    "timestamp": historical_prices[start + j].get("timestamp") or now,
+                    "balance": row_balance,
+                    "position_value": position_value,
+                    "total_value": total_value
+                }
+                for j, (row_balance, position_value, total_value) in enumerate(history_arr.tolist())
+            ]
         
         # محاسبه آمار
-        final_balance = balance + (position * prices[-1])
+        final_balance = balance + (position * float(prices[-1]))
         total_return = final_balance - initial_balance
         total_return_percent = (total_return / initial_balance) * 100
         
-        buy_trades = [t for t in trades if t["type"] == "buy"]
-        sell_trades = [t for t in trades if t["type"] == "sell"]
-        
-        winning_trades = len([t for t in sell_trades if t.get("profit_loss", 0) > 0])
-        losing_trades = len([t for t in sell_trades if t.get("profit_loss", 0) <= 0])
+        losing_trades = sell_count - winning_trades
         
         return {
             "initial_balance": initial_balance,
@@ -462,11 +589,11 @@ class EmaRsiStrategy:
             "total_return": total_return,
             "total_return_percent": total_return_percent,
             "total_trades": len(trades),
-            "buy_trades": len(buy_trades),
-            "sell_trades": len(sell_trades),
+            "buy_trades": buy_count,
+            "sell_trades": sell_count,
             "winning_trades": winning_trades,
             "losing_trades": losing_trades,
-            "win_rate": (winning_trades / len(sell_trades) * 100) if sell_trades else 0,
+            "win_rate": (winning_trades / sell_count * 100) if sell_count else 0,
             "trades": trades,
             "balance_history": balance_history
         }
\ No newline at end of file